@@ -0,0 +1,95 @@
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from grid import CostGrid
+from search import HEURISTICS, SEARCH_MODES, distance_table, field_path, index_of
+
+# Path planning for many agents on one map, without a Game and without any sprites.
+#
+# Queries are grouped by goal. A goal shared by several queries is answered by one search backwards
+# from the goal (distance_table), which covers all of their starts at once; the other queries run
+# the selected search mode. The groups are spread over worker processes that attach to the cost
+# grid in shared memory, so the map is copied once instead of being pickled for every worker.
+
+# set up in every worker process by _init_worker
+_memory = None
+_grid = None
+_search = None
+
+
+def _init_worker(memory_name, rows, cols, source, heuristic, mode):
+    global _memory, _grid, _search
+    _memory = shared_memory.SharedMemory(name=memory_name)
+    costs = _memory.buf.cast('H')[:(rows + 2) * (cols + 2)]
+    _grid = CostGrid(rows, cols, costs)
+    _grid.source = source
+    _search = SEARCH_MODES[mode], HEURISTICS[heuristic]
+
+
+# grid indices -> map cells numbered row * cols + col
+def _cells(grid, path):
+    width, cols = grid.width, grid.cols
+    return array('I', [(index // width - 1) * cols + index % width - 1 for index in path])
+
+
+def _solve_group(grid, goal, starts, search, heuristic_factory):
+    if len(starts) > 1:
+        field = distance_table(grid, goal, reverse=True)
+        paths = [field_path(grid, field, start, goal) for start in starts]
+    else:
+        paths = [search(grid, start, goal, heuristic_factory) for start in starts]
+    return [_cells(grid, path) for path in paths]
+
+
+def _solve_worker_group(group):
+    goal, starts = group
+    return _solve_group(_grid, goal, starts, *_search)
+
+
+def _solve_in_pool(grid, groups, heuristic, mode, workers):
+    if grid.source is not None and (mode == 'index' or heuristic == 'alt'):
+        # store the index next to the map once, so the workers only load it
+        index_of(grid)
+    size = len(grid.costs) * grid.costs.itemsize
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    try:
+        memory.buf[:size] = grid.costs.tobytes()
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(memory.name, grid.rows, grid.cols, grid.source, heuristic, mode)) as executor:
+            return list(executor.map(_solve_worker_group, groups, chunksize=max(1, len(groups) // (4 * workers))))
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+# Plans the paths of many agents on one map.
+# queries - list of ((start row, start col), (goal row, goal col))
+# heuristic, mode - names from HEURISTICS and SEARCH_MODES, like the Draza and Bole options
+# workers - number of worker processes, defaults to the number of CPUs; 1 plans in this process
+# return value - for every query an array('I') of the map cells of its path, numbered row * cols + col
+# (empty if the goal is unreachable)
+def plan_paths(grid, queries, heuristic='manhattan', mode='forward', workers=None):
+    if heuristic not in HEURISTICS:
+        raise Exception(f'ERR: Unknown heuristic {heuristic}! Known heuristics are ({", ".join(HEURISTICS)})')
+    if mode not in SEARCH_MODES:
+        raise Exception(f'ERR: Unknown search mode {mode}! Known modes are ({", ".join(SEARCH_MODES)})')
+    # goal -> [(query number, start)]
+    members = {}
+    for number, (start, goal) in enumerate(queries):
+        members.setdefault(grid.index(*goal), []).append((number, grid.index(*start)))
+    groups = [(goal, [start for _, start in group]) for goal, group in members.items()]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(groups))
+    if workers > 1:
+        results = _solve_in_pool(grid, groups, heuristic, mode, workers)
+    else:
+        results = [_solve_group(grid, goal, starts, SEARCH_MODES[mode], HEURISTICS[heuristic])
+                   for goal, starts in groups]
+    paths = [None] * len(queries)
+    for group, group_paths in zip(members.values(), results):
+        for (number, _), path in zip(group, group_paths):
+            paths[number] = path
+    return paths
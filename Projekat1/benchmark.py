@@ -0,0 +1,116 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import config
+from grid import CostGrid
+from mapfile import load_map
+from planners import PLANNERS, create_planner
+
+AGENTS = tuple(PLANNERS.keys())
+FIELDS = ('map', 'agent', 'rows', 'cols', 'time', 'speedup', 'nodes_expanded', 'nodes_generated',
+          'peak_frontier', 'reexpansions', 'phase_times', 'peak_memory', 'path_length', 'path_cost',
+          'suboptimality_bound', 'goal_reached')
+
+
+# start, goal - grid indices
+# trace_file - file to write the expanded cells of the timed run to (see Planner.plan)
+def run_agent(agent_spec, grid, start, goal, measure_memory=True, trace_file=None):
+    planner = create_planner(agent_spec)
+    config.TRACE_FILE = trace_file
+    start_time = time.perf_counter()
+    try:
+        path = planner.plan(grid, start, goal)
+    finally:
+        config.TRACE_FILE = None
+    elapsed = time.perf_counter() - start_time
+    grid.check_path(path)
+    stats = planner.stats
+    peak_memory = None
+    if measure_memory:
+        # separate run, tracing slows the search down too much to time it at the same time
+        planner = create_planner(agent_spec)
+        tracemalloc.start()
+        planner.plan(grid, start, goal)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        'agent': agent_spec,
+        'time': round(elapsed, 6),
+        'speedup': None,
+        'nodes_expanded': stats.nodes_expanded,
+        'nodes_generated': stats.nodes_generated,
+        'peak_frontier': stats.peak_frontier,
+        'reexpansions': stats.reexpansions,
+        'phase_times': ';'.join(f'{phase}={seconds:.6f}' for phase, seconds in stats.phase_times.items()),
+        'peak_memory': peak_memory,
+        'path_length': len(path),
+        'path_cost': sum(grid.costs[index] for index in path),
+        'suboptimality_bound': round(stats.suboptimality_bound, 3),
+        'goal_reached': bool(path) and path[-1] == goal,
+    }
+
+
+# baseline - agent spec the speedup of the other agents on the same map is measured against
+# trace_folder - folder for the expansion traces, one <map>.<agent>.trace file per run
+def run(map_names, agent_specs, measure_memory=True, baseline=None, trace_folder=None):
+    if baseline is not None and baseline not in agent_specs:
+        agent_specs = [baseline] + list(agent_specs)
+    for map_name in map_names:
+        char_map, start_row, start_col, goal_row, goal_col = load_map(map_name)
+        grid = CostGrid.from_char_map(char_map)
+        grid.source = map_name
+        results = []
+        for agent_spec in agent_specs:
+            result = {'map': map_name, 'rows': grid.rows, 'cols': grid.cols}
+            trace_file = None
+            if trace_folder is not None:
+                trace_file = os.path.join(trace_folder, f'{os.path.basename(map_name)}.{agent_spec}.trace')
+            result.update(run_agent(agent_spec, grid, grid.index(start_row, start_col), grid.index(goal_row, goal_col),
+                                    measure_memory, trace_file))
+            results.append(result)
+        if baseline is not None:
+            baseline_time = next(result['time'] for result in results if result['agent'] == baseline)
+            for result in results:
+                result['speedup'] = round(baseline_time / result['time'], 3) if result['time'] else None
+        yield from results
+
+
+def write_results(results, output, output_format, fields=FIELDS):
+    if output_format == 'json':
+        json.dump(list(results), output, indent=2)
+        output.write('\n')
+    else:
+        writer = csv.DictWriter(output, fieldnames=fields)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+            output.flush()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Run PyTanja agents without pygame and measure their searches.')
+    parser.add_argument('maps', nargs='+', help='map files')
+    parser.add_argument('-a', '--agents', nargs='+', default=list(AGENTS),
+                        help='agent names, optionally with an option (e.g. Bole:alt)')
+    parser.add_argument('-f', '--format', choices=('csv', 'json'), default='csv')
+    parser.add_argument('-o', '--output', help='output file (default: standard output)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory measurement run')
+    parser.add_argument('--baseline', help='agent to report the speedup against (e.g. Draza)')
+    parser.add_argument('--trace', metavar='FOLDER', help='write the expanded cells of every run to FOLDER')
+    args = parser.parse_args(argv)
+
+    results = run(args.maps, args.agents, not args.no_memory, args.baseline, args.trace)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_results(results, f, args.format)
+    else:
+        write_results(results, sys.stdout, args.format)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
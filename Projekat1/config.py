@@ -9,6 +9,19 @@ TILE_SIZE = None
 GAME_SPEED = None
 GAME_FONT = None
 RIBBON_HEIGHT = None
+# print the progress of the searches
+DEBUG = False
+# file the planners write every expanded cell to, None for no trace
+TRACE_FILE = None
+# record where the search expanded cells and show it over the map (toggled with H in the game),
+# also turned on by a 1 as the fourth argument of main.py
+HEATMAP = False
+HEATMAP_ALPHA = 160
+# path steps shown per frame, None animates the agent tile by tile
+STEPS_PER_FRAME = None
+FAST_FORWARD_FPS = 60
+# rendered trail numbers kept for reuse
+GLYPH_CACHE_SIZE = 100000
 
 # define colors
 WHITE = (255, 255, 255)
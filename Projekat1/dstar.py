@@ -0,0 +1,171 @@
+import heapq
+from array import array
+
+from grid import grid_of
+from search import MIN_TILE_COST, UNREACHABLE
+from searchstats import SearchStats, trace_of
+
+# D* Lite (Koenig, Likhachev) - incremental search that keeps the cheapest path to the goal up to date
+# while tile costs change and the agent walks towards the goal.
+#
+# The search runs backward from the goal: g(x) is the cost of the cheapest path from x to the goal
+# found so far, rhs(x) = min over the neighbours y of cost(y) + g(y) (entering y costs cost(y)).
+# Only the cells where the two differ are queued. After a cost change just the neighbours of the
+# changed cells are queued again, and the search stops as soon as the agent's cell is settled, so a
+# repair touches the part of the map the change can affect instead of the whole route.
+# The heuristic is the manhattan bound towards the agent, which holds whatever the new costs are
+# (no tile is cheaper than MIN_TILE_COST). km adds up the bound of every move of the agent, so the
+# keys already queued stay lower bounds without reordering the queue.
+
+
+class DStarLite:
+    # start, goal - grid indices
+    # stats - optional SearchStats, updated by every repair
+    def __init__(self, grid, start, goal, stats=None):
+        self.grid = grid
+        self.start = start
+        self.start_row, self.start_col = divmod(start, grid.width)
+        self.goal = goal
+        self.stats = stats
+        self.g = array('I', [UNREACHABLE]) * grid.size
+        self.rhs = array('I', [UNREACHABLE]) * grid.size
+        self.rhs[goal] = 0
+        self.km = 0
+        # index -> key it is queued with, heap entries with any other key are stale
+        self.queued = {}
+        self.frontier = []
+        # cells expanded by any of the searches so far, pushes onto the frontier (and how many of them
+        # are already in the stats)
+        self.expanded = bytearray(grid.size)
+        self.generated = 0
+        self.counted = 0
+        self._push(goal)
+        self.compute()
+
+    def _h(self, index):
+        row, col = divmod(index, self.grid.width)
+        return (abs(row - self.start_row) + abs(col - self.start_col)) * MIN_TILE_COST
+
+    def _key(self, index):
+        g, rhs = self.g[index], self.rhs[index]
+        best = g if g < rhs else rhs
+        row, col = divmod(index, self.grid.width)
+        return best + (abs(row - self.start_row) + abs(col - self.start_col)) * MIN_TILE_COST + self.km, best
+
+    def _push(self, index):
+        key = self._key(index)
+        self.queued[index] = key
+        heapq.heappush(self.frontier, (key, index))
+        self.generated += 1
+
+    def _update(self, index):
+        g, rhs, costs = self.g, self.rhs, self.grid.costs
+        old_rhs = rhs[index]
+        if index != self.goal:
+            best = UNREACHABLE
+            for offset in self.grid.offsets:
+                neighbour = index + offset
+                step = costs[neighbour]
+                if step and g[neighbour] != UNREACHABLE and step + g[neighbour] < best:
+                    best = step + g[neighbour]
+            rhs[index] = best
+        if g[index] == rhs[index]:
+            self.queued.pop(index, None)
+        elif rhs[index] != old_rhs or index not in self.queued:
+            # a queued cell with the same values keeps its key, it is still a lower bound
+            self._push(index)
+
+    def _update_neighbours(self, index):
+        costs = self.grid.costs
+        for offset in self.grid.offsets:
+            if costs[index + offset]:
+                self._update(index + offset)
+
+    def compute(self):
+        g, rhs, queued, frontier = self.g, self.rhs, self.queued, self.frontier
+        start = self.start
+        trace = trace_of(self.stats)
+        expanded = peak = reexpanded = 0
+        while frontier:
+            if len(frontier) > peak:
+                peak = len(frontier)
+            key, index = frontier[0]
+            if queued.get(index) != key:
+                heapq.heappop(frontier)
+                continue
+            if key >= self._key(start) and rhs[start] == g[start]:
+                break
+            heapq.heappop(frontier)
+            new_key = self._key(index)
+            if key < new_key:
+                self._push(index)
+                continue
+            del queued[index]
+            expanded += 1
+            reexpanded += self.expanded[index]
+            self.expanded[index] = 1
+            if trace is not None:
+                trace(index)
+            if g[index] > rhs[index]:
+                g[index] = rhs[index]
+            else:
+                g[index] = UNREACHABLE
+                self._update(index)
+            self._update_neighbours(index)
+        if self.stats is not None:
+            self.stats.count(expanded, self.generated - self.counted, peak, reexpanded)
+            self.counted = self.generated
+
+    # The agent moved to the cell start (a grid index).
+    def move_to(self, start):
+        self.km += self._h(start)
+        self.start = start
+        self.start_row, self.start_col = divmod(start, self.grid.width)
+
+    # indices - cells whose cost in the grid has been changed, the path is repaired right away
+    def update_cells(self, indices):
+        for index in indices:
+            self._update_neighbours(index)
+        self.compute()
+
+    # return value - list of grid indices from the current start to the goal, empty if it is unreachable
+    def path(self):
+        g, costs, offsets = self.g, self.grid.costs, self.grid.offsets
+        if g[self.start] == UNREACHABLE:
+            return []
+        path = [self.start]
+        current = self.start
+        while current != self.goal:
+            best, best_cost = None, UNREACHABLE
+            for offset in offsets:
+                neighbour = current + offset
+                step = costs[neighbour]
+                if step and g[neighbour] != UNREACHABLE and step + g[neighbour] < best_cost:
+                    best, best_cost = neighbour, step + g[neighbour]
+            current = best
+            path.append(current)
+        return path
+
+
+# D* Lite on a TileMap (see grid.py) - the map and the path are both given as tiles.
+class TileMapPlanner:
+    # start, goal - (row, col)
+    def __init__(self, tile_map, start, goal):
+        self.tile_map = tile_map
+        self.grid = grid_of(tile_map)
+        self.stats = SearchStats()
+        self.search = DStarLite(self.grid, self.grid.index(*start), self.grid.index(*goal), self.stats)
+
+    def path(self):
+        return [self.tile_map[row][col] for row, col in map(self.grid.position, self.search.path())]
+
+    def move_to(self, row, col):
+        self.search.move_to(self.grid.index(row, col))
+
+    # tiles - new tiles, each replaces the tile at its position
+    # return value - the repaired path from the current position
+    def set_tiles(self, tiles):
+        for tile in tiles:
+            self.tile_map.set_tile(tile)
+        self.search.update_cells([self.grid.index(*tile.position()) for tile in tiles])
+        return self.path()
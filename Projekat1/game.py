@@ -1,7 +1,10 @@
 import os
 import sys
+from collections import deque
 import pygame
 import config
+from grid import CostGrid, TileMap, grid_of
+from mapfile import load_map
 from sprites import Stone, Grass, Dune, Water, Road, Mud, Goal, Trail
 
 
@@ -13,7 +16,8 @@ class Game:
     def __init__(self):
         self.path_cost = 0
         pygame.display.set_caption('PyTanja')
-        values = Game.load_map(sys.argv[1] if len(sys.argv) > 1 else os.path.join(config.MAP_FOLDER, 'map0.txt'))
+        map_name = sys.argv[1] if len(sys.argv) > 1 else os.path.join(config.MAP_FOLDER, 'map0.txt')
+        values = Game.load_map(map_name)
         self.char_map = values[0]
         self.start = values[1:3]
         self.goal = values[3:]
@@ -29,8 +33,46 @@ class Game:
         self.tiles_sprites = pygame.sprite.Group()
         self.trails_sprites = pygame.sprite.Group()
         self.agents_sprites = pygame.sprite.Group()
+        self.tile_map = Game.build_tile_map(self.char_map, map_name)
+        for row in self.tile_map:
+            self.tiles_sprites.add(row)
+        self.tiles_sprites.add(Goal(self.goal[0], self.goal[1]))
+        module = __import__('sprites')
+        # agent name can be followed by options, e.g. Bole:alt+bidirectional
+        agent_name, _, option = (sys.argv[2] if len(sys.argv) > 2 else 'ExampleAgent').partition(':')
+        class_ = getattr(module, agent_name)
+        self.agent = class_(self.start[0], self.start[1], f'{agent_name}.png')
+        if option:
+            self.agent.configure(option)
+        self.agents_sprites.add(self.agent)
+        if len(sys.argv) > 3:
+            config.STEPS_PER_FRAME = int(sys.argv[3])
+        # 1 records the expanded cells and shows them as a heatmap (0 as the steps per frame keeps the animation)
+        if len(sys.argv) > 4:
+            config.HEATMAP = bool(int(sys.argv[4]))
+        # fast-forward mode - terrain and trails are drawn once into self.scene, frames only update what changed
+        self.scene = None
+        self.tile_trails = {}
+        self.new_trails = []
+        self.agent_rect = None
+        # expanded cells of the agent's search, one surface over the whole map (see config.HEATMAP)
+        self.heatmap = None
+        self.show_heatmap = True
+        self.clock = pygame.time.Clock()
+        self.running = True
+        self.playing = False
+        self.game_over = False
+
+    # return value - (char_map, start row, start col, goal row, goal col), see mapfile.load_map
+    @staticmethod
+    def load_map(map_name):
+        return load_map(map_name)
+
+    # map_name - file the map was loaded from, lets the searches keep their precomputed data next to it
+    @staticmethod
+    def build_tile_map(char_map, map_name=None):
         tile_map = []
-        for i, row in enumerate(self.char_map):
+        for i, row in enumerate(char_map):
             map_row = []
             for j, el in enumerate(row):
                 if el == 's':
@@ -47,36 +89,30 @@ class Game:
                     t = Dune(i, j)
                 else:
                     t = Grass(i, j)
-                self.tiles_sprites.add(t)
                 map_row.append(t)
             tile_map.append(map_row)
-        self.tile_map = tile_map
-        self.tiles_sprites.add(Goal(self.goal[0], self.goal[1]))
-        module = __import__('sprites')
-        class_ = getattr(module, sys.argv[2] if len(sys.argv) > 2 else 'ExampleAgent')
-        self.agent = class_(self.start[0], self.start[1],
-                            f'{sys.argv[2]}.png' if len(sys.argv) > 2 else 'ExampleAgent.png')
-        self.agents_sprites.add(self.agent)
-        self.clock = pygame.time.Clock()
-        self.running = True
-        self.playing = False
-        self.game_over = False
+        cost_grid = CostGrid.from_char_map(char_map)
+        cost_grid.source = map_name
+        return TileMap(tile_map, cost_grid)
 
+    # One pixel per tile, coloured from yellow (expanded first) to red (expanded last) and more opaque
+    # for tiles expanded more than once, then scaled up to the map, so a frame blits it once.
     @staticmethod
-    def load_map(map_name):
-        try:
-            with open(map_name, 'r') as f:
-                ar, ac = [int(val) for val in f.readline().strip().split(',')]
-                gr, gc = [int(val) for val in f.readline().strip().split(',')]
-                matrix = []
-                while True:
-                    line = f.readline().strip()
-                    if not len(line):
-                        break
-                    matrix.append([c for c in line])
-            return matrix, ar, ac, gr, gc
-        except Exception as e:
-            raise e
+    def build_heatmap(grid, stats):
+        counts, order = stats.expansion_counts, stats.expansion_order
+        last = max(order) or 1
+        pixels = bytearray(4 * grid.rows * grid.cols)
+        pixel = 0
+        for row in range(grid.rows):
+            index = grid.index(row, 0)
+            for index in range(index, index + grid.cols):
+                if counts[index]:
+                    pixels[pixel] = 255
+                    pixels[pixel + 1] = 255 - 255 * order[index] // last
+                    pixels[pixel + 3] = min(255, config.HEATMAP_ALPHA + 24 * (counts[index] - 1))
+                pixel += 4
+        heatmap = pygame.image.frombuffer(bytes(pixels), (grid.cols, grid.rows), 'RGBA')
+        return pygame.transform.scale(heatmap, (config.WIDTH, config.HEIGHT))
 
     def check_move(self, old_x, old_y, x, y):
         if abs(old_x - x) + abs(old_y - y) != 1:
@@ -92,20 +128,40 @@ class Game:
         print(f"Path: {', '.join([str(p.position()) for p in path])}")
         print(f'Path length: {len(path)}')
         print(f'Path cost: {sum([t.cost() for t in path])}')
-        tile = path.pop(0)
+        if self.agent.stats is not None:
+            print(f'Search: {self.agent.stats}')
+            if self.agent.stats.expansion_counts is not None:
+                self.heatmap = Game.build_heatmap(grid_of(self.tile_map), self.agent.stats)
+        path = deque(path)
+        tile = path.popleft()
         x, y = tile.position()
         self.path_cost = tile.cost()
         step_count = 1
         game_time = 0
         while self.running:
             try:
-                if self.playing:
+                if self.playing and config.STEPS_PER_FRAME:
+                    for _ in range(config.STEPS_PER_FRAME):
+                        self.agent.place_to(x, y)
+                        self.add_trail(Trail(x, y, step_count))
+                        step_count += 1
+                        try:
+                            tile = path.popleft()
+                        except IndexError:
+                            raise EndGame()
+                        old_x, old_y = x, y
+                        x, y = tile.position()
+                        self.check_move(old_x, old_y, x, y)
+                        self.path_cost += tile.cost()
+                    self.agent.place_to(x, y)
+                    self.clock.tick(config.FAST_FORWARD_FPS)
+                elif self.playing:
                     if not game_time:
                         self.agent.place_to(x, y)
-                        self.trails_sprites.add(Trail(x, y, step_count))
+                        self.add_trail(Trail(x, y, step_count))
                         step_count += 1
                         try:
-                            tile = path.pop(0)
+                            tile = path.popleft()
                         except IndexError:
                             raise EndGame()
                         old_x, old_y = x, y
@@ -133,6 +189,8 @@ class Game:
                             self.check_move(old_x, old_y, x, y)
                         self.trails_sprites.add(Trail(x, y, num + 1))
                     self.agent.place_to(goal_x, goal_y)
+                    # the trails were replaced, the scene is drawn again
+                    self.scene = None
             except Exception as e:
                 self.game_over = True
                 raise e
@@ -140,9 +198,19 @@ class Game:
     def quit(self):
         self.running = False
 
+    def add_trail(self, trail):
+        self.trails_sprites.add(trail)
+        if config.STEPS_PER_FRAME:
+            self.new_trails.append(trail)
+
     def draw(self):
+        if config.STEPS_PER_FRAME:
+            self.draw_changes()
+            return
         self.screen.fill(config.BLACK, rect=(0, config.HEIGHT, config.WIDTH, config.RIBBON_HEIGHT))
         self.tiles_sprites.draw(self.screen)
+        if self.heatmap is not None and self.show_heatmap:
+            self.screen.blit(self.heatmap, (0, 0))
         self.trails_sprites.draw(self.screen)
         for t in self.trails_sprites:
             t.draw(self.screen)
@@ -155,11 +223,56 @@ class Game:
             self.screen.blit(game_over, text_rect)
         pygame.display.flip()
 
+    # Fast-forward drawing - the tiles are drawn once into the scene and every trail is added to it
+    # once, so a frame only copies the scene back under the areas that changed and updates those.
+    def draw_changes(self):
+        dirty = []
+        if self.scene is None:
+            self.scene = pygame.Surface((config.WIDTH, config.HEIGHT))
+            self.tiles_sprites.draw(self.scene)
+            if self.heatmap is not None and self.show_heatmap:
+                self.scene.blit(self.heatmap, (0, 0))
+            # (row, col) -> trails on that tile, their numbers are all drawn above the trail images
+            self.tile_trails = {}
+            self.new_trails = self.trails_sprites.sprites()
+            dirty.append(self.scene.get_rect())
+        for trail in self.new_trails:
+            trails = self.tile_trails.setdefault((trail.row, trail.col), [])
+            trails.append(trail)
+            self.scene.blit(trail.image, trail.rect)
+            for t in trails:
+                t.draw(self.scene)
+            dirty.append(trail.rect)
+        self.new_trails = []
+        if self.agent_rect is not None:
+            dirty.append(self.agent_rect)
+        if self.game_over:
+            game_over = config.GAME_FONT.render('GAME OVER', True, config.RED)
+            text_rect = game_over.get_rect(center=(config.WIDTH // 2, config.HEIGHT // 2))
+            dirty.append(text_rect)
+        for rect in dirty:
+            self.screen.blit(self.scene, rect, rect)
+        self.agents_sprites.draw(self.screen)
+        self.agent_rect = self.agent.rect.copy()
+        dirty.append(self.agent_rect)
+        if self.game_over:
+            self.screen.blit(game_over, text_rect)
+        ribbon = pygame.Rect(0, config.HEIGHT, config.WIDTH, config.RIBBON_HEIGHT)
+        self.screen.fill(config.BLACK, rect=ribbon)
+        cost = config.GAME_FONT.render(f'Score: {str(self.path_cost)}', True, config.GREEN)
+        self.screen.blit(cost, (10, config.HEIGHT + config.RIBBON_HEIGHT // 5))
+        dirty.append(ribbon)
+        pygame.display.update(dirty)
+
     def events(self):
         # catch all events here
         for event in pygame.event.get():
             if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 self.quit()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_h and self.heatmap is not None:
+                self.show_heatmap = not self.show_heatmap
+                # the heatmap is part of the scene
+                self.scene = None
             if self.game_over:
                 return
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
@@ -0,0 +1,95 @@
+from array import array
+
+# same costs as the Tile classes in sprites.py, unknown characters are loaded as grass
+TILE_COSTS = {'s': 1000, 'w': 500, 'r': 2, 'g': 3, 'm': 5, 'd': 7}
+DEFAULT_KIND = 'g'
+# cost of the border cells around the map - a cost of 0 means the cell can not be entered
+WALL = 0
+
+
+# Flat, array backed cost map used by the search algorithms.
+# The map is surrounded by a one cell wide border of WALL cells, so moving from any cell
+# by one of the offsets never leaves the array and needs no bounds checks.
+# Cells are addressed by index = (row + 1) * width + (col + 1).
+class CostGrid:
+    def __init__(self, rows, cols, costs):
+        self.rows = rows
+        self.cols = cols
+        self.width = cols + 2
+        self.size = (rows + 2) * self.width
+        self.costs = costs
+        # west, south, east, north
+        self.offsets = (-1, self.width, 1, -self.width)
+        # data derived from the costs by the searches (e.g. rectangle decompositions), built once per grid
+        self.cache = {}
+        # map file the grid was loaded from, if any
+        self.source = None
+
+    @staticmethod
+    def from_costs(rows, cols=None):
+        if cols is None:
+            cols = len(rows[0])
+        costs = array('H', [WALL]) * (cols + 2)
+        for row in rows:
+            costs.append(WALL)
+            costs.extend(row)
+            costs.append(WALL)
+        costs.extend(array('H', [WALL]) * (cols + 2))
+        return CostGrid(len(rows), cols, costs)
+
+    @staticmethod
+    def from_char_map(char_map):
+        default = TILE_COSTS[DEFAULT_KIND]
+        if hasattr(char_map, 'iter_bytes'):
+            # MapView - costs are looked up straight from the mapped bytes
+            table = [default] * 256
+            for kind, cost in TILE_COSTS.items():
+                table[ord(kind)] = cost
+            return CostGrid.from_costs([map(table.__getitem__, row) for row in char_map.iter_bytes()],
+                                       char_map.cols)
+        return CostGrid.from_costs([[TILE_COSTS.get(ch, default) for ch in row] for row in char_map])
+
+    @staticmethod
+    def from_tile_map(tile_map):
+        return CostGrid.from_costs([[tile.cost() for tile in row] for row in tile_map])
+
+    def index(self, row, col):
+        return (row + 1) * self.width + col + 1
+
+    def position(self, index):
+        row, col = divmod(index, self.width)
+        return row - 1, col - 1
+
+    def cost(self, row, col):
+        return self.costs[self.index(row, col)]
+
+    # Raises the same error as Game.check_move when two consecutive cells of path are not adjacent.
+    def check_path(self, path):
+        for previous, index in zip(path, path[1:]):
+            if abs(index - previous) not in (1, self.width):
+                raise Exception(f'ERR: Path nodes {self.position(previous)} and {self.position(index)} are not adjacent!')
+
+    # The data cached from the old costs is dropped, and the grid no longer matches its map file.
+    def set_cost(self, row, col, cost):
+        self.costs[self.index(row, col)] = cost
+        self.cache.clear()
+        self.source = None
+
+
+# List of lists of Tile objects that also carries the cost grid of the same map,
+# so agents can search over the grid and only look up tiles of the final path.
+class TileMap(list):
+    def __init__(self, tile_map, cost_grid):
+        super().__init__(tile_map)
+        self.cost_grid = cost_grid
+
+    # tile - Tile that replaces the one at its position, e.g. when a road turns into mud
+    def set_tile(self, tile):
+        row, col = tile.position()
+        self[row][col] = tile
+        self.cost_grid.set_cost(row, col, tile.cost())
+
+
+def grid_of(game_map):
+    grid = getattr(game_map, 'cost_grid', None)
+    return grid if grid is not None else CostGrid.from_tile_map(game_map)
@@ -0,0 +1,344 @@
+import argparse
+import heapq
+import struct
+import sys
+import time
+from array import array
+
+from grid import CostGrid
+from mapfile import load_map
+from mapindex import MapIndex, content_hash, index_file, little_endian
+from searchstats import make_heuristic, trace_of
+
+# Hierarchical path-finding (HPA*) for big maps.
+#
+# The grid is cut into CLUSTER_SIZE x CLUSTER_SIZE clusters. Cells on both sides of a cluster border
+# become transition nodes of an abstract graph: crossing the border is an edge costing the entered
+# tile, and the transitions of one cluster are connected by the cheapest paths that stay inside it.
+# A query links start and goal to the transitions of their clusters, searches the small abstract
+# graph and then refines the result with A* over the cells of the clusters the abstract path visits.
+#
+# An entrance is a run of border crossings with the same tile costs on both sides. Near-optimal
+# graphs keep only a few crossings per entrance (the middle one and, for long entrances, both ends),
+# which makes them small but can miss the optimal crossing. Exact graphs keep every border cell, so
+# the abstract distances are the real ones and the path is optimal, at the price of a much slower
+# build.
+#
+# Searches build the graph in memory, once per grid. Running this module stores the graphs of the
+# given maps next to them (map0.txt -> map0.txt.hpa, or map0.txt.hpa-exact), and searches on grids
+# loaded from those maps read the stored graph instead of building it. File layout, little endian:
+#   header - magic, version, sha256 of the map file, grid rows, grid cols, cluster size, edge count
+#   edges  - edge count * (u32 node, u32 node, u32 cost), nodes are grid indices
+
+CLUSTER_SIZE = 16
+# entrances at least this long also get a crossing at each end
+LONG_ENTRANCE = 6
+UNREACHABLE = 2 ** 32 - 1
+GRAPH_SUFFIX = '.hpa'
+EXACT_GRAPH_SUFFIX = '.hpa-exact'
+MAGIC = b'PTHPA'
+VERSION = 1
+HEADER = struct.Struct('<5sB32sIIII')
+
+
+class AbstractGraph:
+    # edges - node -> {node: cost} of a stored graph, built from the grid when None
+    def __init__(self, grid, exact=False, cluster_size=CLUSTER_SIZE, edges=None):
+        self.grid = grid
+        self.exact = exact
+        self.cluster_size = cluster_size
+        self.cluster_rows = -(-grid.rows // cluster_size)
+        self.cluster_cols = -(-grid.cols // cluster_size)
+        self.cluster_count = self.cluster_rows * self.cluster_cols
+        # cluster id of every cell, cluster_count for the wall border
+        self.clusters = array('I', [self.cluster_count]) * grid.size
+        for row in range(grid.rows):
+            start = grid.index(row, 0)
+            cluster_row = row // cluster_size * self.cluster_cols
+            self.clusters[start:start + grid.cols] = array(
+                'I', [cluster_row + col // cluster_size for col in range(grid.cols)])
+        # cluster id -> transition nodes (grid indices), node -> {node: cost}
+        self.transitions = [set() for _ in range(self.cluster_count)]
+        self.edges = {}
+        # cheapest tile of the grid, for the lower bound of the path cost
+        self.cheapest = min(filter(None, grid.costs), default=0)
+        if edges is not None:
+            # every node of an edge is a transition
+            self.edges = edges
+            for node in edges:
+                self.transitions[self.clusters[node]].add(node)
+            return
+        self._add_entrances()
+        for cluster in range(self.cluster_count):
+            self._connect(cluster)
+
+    def _add_crossing(self, index, other):
+        costs = self.grid.costs
+        self.transitions[self.clusters[index]].add(index)
+        self.transitions[self.clusters[other]].add(other)
+        self.edges.setdefault(index, {})[other] = costs[other]
+        self.edges.setdefault(other, {})[index] = costs[index]
+
+    # crossings - (cell, cell across the border) pairs along one border, in order
+    # An entrance is a run of passable crossings with the same tile costs on both sides, it ends
+    # where the run is blocked or either cost changes.
+    def _add_border(self, crossings):
+        costs = self.grid.costs
+        entrance = []
+        for index, other in crossings + [(None, None)]:
+            passable = index is not None and costs[index] and costs[other]
+            if passable and (not entrance or (costs[index], costs[other]) == (
+                    costs[entrance[-1][0]], costs[entrance[-1][1]])):
+                entrance.append((index, other))
+                continue
+            if entrance:
+                self._add_entrance(entrance)
+            entrance = [(index, other)] if passable else []
+
+    # the crossings of an entrance all cost the same, near-optimal graphs keep the middle one
+    def _add_entrance(self, entrance):
+        if self.exact:
+            chosen = entrance
+        else:
+            chosen = {entrance[len(entrance) // 2]}
+            if len(entrance) >= LONG_ENTRANCE:
+                chosen.update((entrance[0], entrance[-1]))
+        for index, other in chosen:
+            self._add_crossing(index, other)
+
+    def _add_entrances(self):
+        grid, size = self.grid, self.cluster_size
+        for border in range(size, grid.cols, size):
+            for top in range(0, grid.rows, size):
+                rows = range(top, min(top + size, grid.rows))
+                self._add_border([(grid.index(row, border - 1), grid.index(row, border)) for row in rows])
+        for border in range(size, grid.rows, size):
+            for left in range(0, grid.cols, size):
+                cols = range(left, min(left + size, grid.cols))
+                self._add_border([(grid.index(border - 1, col), grid.index(border, col)) for col in cols])
+
+    def _connect(self, cluster):
+        nodes = self.transitions[cluster]
+        for node in nodes:
+            distances = self.distances(node)
+            edges = self.edges.setdefault(node, {})
+            for other in nodes:
+                if other != node and other in distances:
+                    edges[other] = distances[other]
+
+    # Cheapest paths from source to the cells of its cluster, or from them to source (reverse=True),
+    # without leaving the cluster.
+    def distances(self, source, reverse=False):
+        costs, offsets, clusters = self.grid.costs, self.grid.offsets, self.clusters
+        cluster = clusters[source]
+        distances = {source: 0}
+        frontier = [(0, source)]
+        while frontier:
+            cost, index = heapq.heappop(frontier)
+            if cost > distances[index]:
+                continue
+            backward_step = costs[index]
+            for offset in offsets:
+                neighbour = index + offset
+                if clusters[neighbour] != cluster:
+                    continue
+                new_cost = cost + (backward_step if reverse else costs[neighbour])
+                if new_cost < distances.get(neighbour, UNREACHABLE):
+                    distances[neighbour] = new_cost
+                    heapq.heappush(frontier, (new_cost, neighbour))
+        return distances
+
+    def save(self, file_name, digest):
+        values = array('I')
+        for node, edges in self.edges.items():
+            for other, cost in edges.items():
+                values.extend((node, other, cost))
+        with open(file_name, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, digest, self.grid.rows, self.grid.cols, self.cluster_size,
+                                len(values) // 3))
+            little_endian(values).tofile(f)
+
+    # return value - the stored graph, or None if there is none or it was built for different map contents
+    @staticmethod
+    def load(file_name, digest, grid, exact):
+        try:
+            with open(file_name, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, stored_digest, rows, cols, cluster_size, edge_count = HEADER.unpack_from(data)
+        if (magic != MAGIC or version != VERSION or stored_digest != digest
+                or (rows, cols) != (grid.rows, grid.cols) or len(data) != HEADER.size + 12 * edge_count):
+            return None
+        values = little_endian(array('I', data[HEADER.size:]))
+        edges = {}
+        for node, other, cost in zip(values[0::3], values[1::3], values[2::3]):
+            edges.setdefault(node, {})[other] = cost
+        return AbstractGraph(grid, exact, cluster_size, edges)
+
+
+def graph_file(map_name, exact):
+    return map_name + (EXACT_GRAPH_SUFFIX if exact else GRAPH_SUFFIX)
+
+
+# Abstract graph of the grid, cached on the grid. Grids loaded from a map file get the stored graph
+# when there is one that still matches the map contents. Otherwise the graph is built, or with
+# build=False None is returned.
+def graph_of(grid, exact, build=True):
+    key = 'hpa exact' if exact else 'hpa'
+    graph = grid.cache.get(key)
+    if graph is not None:
+        return graph
+    if grid.source is not None:
+        graph = AbstractGraph.load(graph_file(grid.source, exact), content_hash(grid.source), grid, exact)
+    if graph is None:
+        if not build:
+            return None
+        graph = AbstractGraph(grid, exact)
+    grid.cache[key] = graph
+    return graph
+
+
+def store_graph(map_name, exact=False):
+    char_map = load_map(map_name)[0]
+    graph = AbstractGraph(CostGrid.from_char_map(char_map), exact)
+    graph.save(graph_file(map_name, exact), content_hash(map_name))
+
+
+def _search(start, goal, successors, heuristic, stats=None):
+    best_cost = {start: 0}
+    parent = {start: None}
+    closed = set()
+    frontier = [(heuristic(start), 0, start)]
+    counter = 1
+    peak = 1
+    trace = trace_of(stats)
+    while frontier:
+        if len(frontier) > peak:
+            peak = len(frontier)
+        node = heapq.heappop(frontier)[2]
+        if node in closed:
+            continue
+        if node == goal:
+            break
+        closed.add(node)
+        if trace is not None:
+            trace(node)
+        cost = best_cost[node]
+        for neighbour, step in successors(node):
+            if neighbour in closed:
+                continue
+            new_cost = cost + step
+            if new_cost < best_cost.get(neighbour, UNREACHABLE):
+                best_cost[neighbour] = new_cost
+                parent[neighbour] = node
+                heapq.heappush(frontier, (new_cost + heuristic(neighbour), counter, neighbour))
+                counter += 1
+    if stats is not None:
+        stats.count(len(closed), counter, peak)
+    if goal not in parent:
+        return [], None
+    path = []
+    node = goal
+    while node is not None:
+        path.append(node)
+        node = parent[node]
+    path.reverse()
+    return path, best_cost[goal]
+
+
+# Searches the abstract graph with start and goal linked to the transitions of their clusters.
+# return value - (abstract path from start to goal, its cost), ([], None) if the goal is unreachable
+def abstract_search(graph, start, goal, heuristic, stats=None):
+    from_start = graph.distances(start)
+    to_goal = graph.distances(goal, reverse=True)
+    start_edges = [(node, from_start[node]) for node in graph.transitions[graph.clusters[start]]
+                   if node in from_start]
+    if goal in from_start:
+        start_edges.append((goal, from_start[goal]))
+    # a start on a cluster border also keeps its own edges, the crossings among them
+    start_edges.extend(graph.edges.get(start, {}).items())
+    goal_cluster = graph.clusters[goal]
+
+    def successors(node):
+        if node == start:
+            return start_edges
+        edges = list(graph.edges.get(node, {}).items())
+        if graph.clusters[node] == goal_cluster and node in to_goal:
+            edges.append((goal, to_goal[node]))
+        return edges
+
+    return _search(start, goal, successors, heuristic, stats)
+
+
+# Lower bound of the optimal path cost: the abstract optimum when an exact graph of the map is already
+# cached or stored (that one is the optimal cost), otherwise the landmark bound when the map has a
+# distance index, otherwise the heuristic estimate and the manhattan distance at the cheapest tile cost.
+def lower_bound(grid, graph, start, goal, heuristic):
+    exact_graph = graph_of(grid, True, build=False)
+    if exact_graph is not None:
+        return abstract_search(exact_graph, start, goal, heuristic)[1]
+    (start_row, start_col), (goal_row, goal_col) = grid.position(start), grid.position(goal)
+    bound = max(heuristic(start), (abs(start_row - goal_row) + abs(start_col - goal_col)) * graph.cheapest)
+    index = grid.cache.get('index')
+    if index is None and grid.source is not None:
+        index = MapIndex.load(index_file(grid.source), content_hash(grid.source))
+    if index is not None and (index.rows, index.cols) == (grid.rows, grid.cols):
+        bound = max(bound, index.lower_bound(grid.costs, start, goal))
+    return bound
+
+
+def hpa_search(grid, start, goal, heuristic_factory, stats=None, exact=False):
+    if start == goal:
+        return [start]
+    start_time = time.perf_counter()
+    graph = graph_of(grid, exact)
+    if stats is not None:
+        stats.add_time('abstract graph', start_time)
+    heuristic = make_heuristic(heuristic_factory, grid, goal, stats)
+    start_time = time.perf_counter()
+    abstract_path, abstract_cost = abstract_search(graph, start, goal, heuristic, stats)
+    if stats is not None:
+        stats.add_time('abstract search', start_time)
+    if not abstract_path:
+        return []
+
+    # refinement - A* restricted to the clusters the abstract path goes through
+    costs, offsets, clusters = grid.costs, grid.offsets, graph.clusters
+    corridor = bytearray(graph.cluster_count + 1)
+    for node in abstract_path:
+        corridor[clusters[node]] = 1
+
+    def cell_successors(index):
+        return [(index + offset, costs[index + offset]) for offset in offsets
+                if corridor[clusters[index + offset]]]
+
+    start_time = time.perf_counter()
+    path, cost = _search(start, goal, cell_successors, heuristic, stats)
+    if stats is not None:
+        stats.add_time('refinement', start_time)
+        if not exact:
+            start_time = time.perf_counter()
+            bound = lower_bound(grid, graph, start, goal, heuristic)
+            stats.suboptimality_bound = cost / bound if bound else float('inf')
+            stats.add_time('lower bound', start_time)
+    return path
+
+
+def exact_hpa_search(grid, start, goal, heuristic_factory, stats=None):
+    return hpa_search(grid, start, goal, heuristic_factory, stats, exact=True)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Build the HPA* abstract graphs of maps and store them next to the maps.')
+    parser.add_argument('maps', nargs='+', help='map files')
+    parser.add_argument('--exact', action='store_true', help='store the exact graph (for the hpa-exact mode)')
+    args = parser.parse_args(argv)
+    for map_name in args.maps:
+        store_graph(map_name, args.exact)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,193 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+
+# Read only view of the character rows of a memory-mapped map file.
+# The cells are never copied: row r is data[offset + r * stride: offset + r * stride + cols].
+# Indexing and iterating still give lists of characters like the old list of lists map did;
+# a row is decoded the first time it is used and kept afterwards.
+class MapView:
+    def __init__(self, data, offset, rows, cols, stride):
+        self.data = data
+        self.offset = offset
+        self.rows = rows
+        self.cols = cols
+        self.stride = stride
+        self._rows = [None] * rows
+
+    def row_bytes(self, row):
+        start = self.offset + row * self.stride
+        return self.data[start:start + self.cols]
+
+    def iter_bytes(self):
+        for row in range(self.rows):
+            yield self.row_bytes(row)
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError('map row index out of range')
+        cached = self._rows[row]
+        if cached is None:
+            cached = self._rows[row] = list(self.row_bytes(row).tobytes().decode('ascii'))
+        return cached
+
+    def __iter__(self):
+        for row in range(self.rows):
+            yield self[row]
+
+
+def _read_lines(data, offset, count):
+    values = []
+    for _ in range(count):
+        end = data.find(b'\n', offset)
+        if end < 0:
+            raise Exception('ERR: Map file header is incomplete!')
+        values.append(bytes(data[offset:end]).strip().decode('ascii'))
+        offset = end + 1
+    return values, offset
+
+
+# Maps the file to memory and locates the character rows that follow header_lines header lines.
+# return value - (header lines, MapView), or None if the rows are not all of the same length or have
+# leading or trailing whitespace, and the file has to be parsed line by line.
+def map_file(map_name, header_lines=0):
+    with open(map_name, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty file
+            return None
+    header, offset = _read_lines(data, offset=0, count=header_lines)
+    end = data.find(b'\n', offset)
+    if end < 0:
+        end = len(data)
+    newline = b'\r\n' if end > offset and data[end - 1] == ord('\r') else b'\n'
+    cols = end - offset - len(newline) + 1
+    if cols <= 0:
+        return None
+    stride = cols + len(newline)
+    # like the line by line parser, the grid ends with the first blank line or with the file,
+    # every row has to be exactly cols characters followed by a line break or the end of the file
+    rows = 0
+    row_start = offset
+    while row_start < len(data) and data[row_start:row_start + len(newline)] != newline:
+        row_end = row_start + cols
+        cells = data[row_start:row_end]
+        if (len(cells) != cols or cells.strip() != cells or b'\n' in cells or b'\r' in cells or
+                row_end != len(data) and data[row_end:row_end + len(newline)] != newline):
+            return None
+        rows += 1
+        row_start = row_end + len(newline)
+    return header, MapView(memoryview(data), offset, rows, cols, stride)
+
+
+# Compiled maps - the cells are stored one byte per cell, as the characters of the text maps and
+# without line breaks, so a MapView reads them straight from the mapped file.
+#
+# File layout (little endian):
+#   header    - magic, version, rows, cols, position count, sha256 of the positions and the cells
+#   positions - position count * (kind character, u32 row, u32 col): the start S and the goal G in
+#               Projekat1, the agents by their digit in Projekat2
+#   cells     - rows * cols bytes, row by row
+BINARY_SUFFIX = '.ptmap'
+BINARY_MAGIC = b'PTMAP'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<5sBIII32s')
+POSITION = struct.Struct('<cII')
+
+
+# char_map - list of lists of characters (or a MapView), positions - list of (kind, row, col)
+def write_binary_map(file_name, char_map, positions):
+    rows = [''.join(row).encode('ascii') for row in char_map]
+    cols = len(rows[0]) if rows else 0
+    if any(len(row) != cols for row in rows):
+        raise Exception('ERR: Rows of the map are not all of the same length!')
+    body = b''.join(POSITION.pack(kind.encode('ascii'), row, col) for kind, row, col in positions) + b''.join(rows)
+    with open(file_name, 'wb') as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, len(rows), cols, len(positions),
+                                   hashlib.sha256(body).digest()))
+        f.write(body)
+
+
+# return value - (positions, MapView of the memory-mapped cells), positions - list of (kind, row, col),
+# or None if the file is not a compiled map
+def read_binary_map(map_name):
+    with open(map_name, 'rb') as f:
+        if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+            return None
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(data) < BINARY_HEADER.size:
+        raise Exception(f'ERR: Map file {map_name} is incomplete!')
+    _, version, rows, cols, count, digest = BINARY_HEADER.unpack_from(data)
+    if version != BINARY_VERSION:
+        raise Exception(f'ERR: Map file {map_name} has unsupported version {version}!')
+    offset = BINARY_HEADER.size + count * POSITION.size
+    if len(data) != offset + rows * cols:
+        raise Exception(f'ERR: Map file {map_name} is incomplete!')
+    view = memoryview(data)
+    if hashlib.sha256(view[BINARY_HEADER.size:]).digest() != digest:
+        raise Exception(f'ERR: Map file {map_name} is damaged (checksum mismatch)!')
+    positions = [(kind.decode('ascii'), row, col)
+                 for kind, row, col in POSITION.iter_unpack(view[BINARY_HEADER.size:offset])]
+    return positions, MapView(view, offset, rows, cols, cols)
+
+
+# map_name - text map or compiled map
+# return value - (char_map, start row, start col, goal row, goal col), char_map is a MapView of the
+# memory-mapped file, or a list of lists if the file has rows of different lengths
+def load_map(map_name):
+    compiled = read_binary_map(map_name)
+    if compiled is not None:
+        positions, matrix = compiled
+        found = {kind: (row, col) for kind, row, col in positions}
+        if 'S' not in found or 'G' not in found:
+            raise Exception(f'ERR: Map file {map_name} has no start or goal!')
+        return (matrix,) + found['S'] + found['G']
+    mapped = map_file(map_name, header_lines=2)
+    if mapped is not None:
+        (start, goal), matrix = mapped
+        ar, ac = [int(val) for val in start.split(',')]
+        gr, gc = [int(val) for val in goal.split(',')]
+        return matrix, ar, ac, gr, gc
+    try:
+        with open(map_name, 'r') as f:
+            ar, ac = [int(val) for val in f.readline().strip().split(',')]
+            gr, gc = [int(val) for val in f.readline().strip().split(',')]
+            matrix = []
+            while True:
+                line = f.readline().strip()
+                if not len(line):
+                    break
+                matrix.append([c for c in line])
+        return matrix, ar, ac, gr, gc
+    except Exception as e:
+        raise e
+
+
+def compile_map(map_name, file_name):
+    char_map, start_row, start_col, goal_row, goal_col = load_map(map_name)
+    write_binary_map(file_name, char_map, [('S', start_row, start_col), ('G', goal_row, goal_col)])
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compile text maps into the binary map format.')
+    parser.add_argument('maps', nargs='+', help='text map files')
+    parser.add_argument('-o', '--output', help=f'compiled map file (default: the map file with the {BINARY_SUFFIX} suffix)')
+    args = parser.parse_args(argv)
+    if args.output and len(args.maps) > 1:
+        parser.error('--output takes a single map')
+    for map_name in args.maps:
+        compile_map(map_name, args.output or os.path.splitext(map_name)[0] + BINARY_SUFFIX)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,168 @@
+import argparse
+import random
+import sys
+
+from mapfile import BINARY_SUFFIX, write_binary_map
+
+KINDS = ('noise', 'maze', 'corridors')
+# terrain share of noise maps, from the lowest noise values to the highest
+DEFAULT_MIX = (('w', 2), ('m', 2), ('g', 4), ('r', 3), ('d', 2), ('s', 1))
+MIN_SIZE = 2
+MAX_SIZE = 2000
+
+
+# Smooth value noise in [0, 1): random values on a coarse lattice, bilinearly interpolated,
+# summed over a few octaves with halving weights.
+def value_noise(rows, cols, rng, scale, octaves=3):
+    field = [[0.0] * cols for _ in range(rows)]
+    total_weight = 0.0
+    weight = 1.0
+    for _ in range(octaves):
+        step = max(scale, 1)
+        lattice_rows = rows // step + 2
+        lattice_cols = cols // step + 2
+        lattice = [[rng.random() for _ in range(lattice_cols)] for _ in range(lattice_rows)]
+        for i in range(rows):
+            top, dy = divmod(i / step, 1)
+            upper, lower = lattice[int(top)], lattice[int(top) + 1]
+            # interpolate between the two lattice rows once, then along the row
+            column = [u + (l - u) * dy for u, l in zip(upper, lower)]
+            row = field[i]
+            for j in range(cols):
+                left, dx = divmod(j / step, 1)
+                left = int(left)
+                row[j] += weight * (column[left] + (column[left + 1] - column[left]) * dx)
+        total_weight += weight
+        weight /= 2
+        scale //= 2
+    return [[value / total_weight for value in row] for row in field]
+
+
+def noise_map(rows, cols, rng, mix=DEFAULT_MIX, scale=None):
+    if scale is None:
+        scale = max(4, max(rows, cols) // 8)
+    field = value_noise(rows, cols, rng, scale)
+    # thresholds are quantiles of the field, so the mix holds for any noise distribution
+    values = sorted(value for row in field for value in row)
+    total = sum(share for _, share in mix)
+    thresholds = []
+    covered = 0
+    for kind, share in mix:
+        covered += share
+        thresholds.append((values[min(len(values) - 1, covered * len(values) // total)], kind))
+    thresholds[-1] = (float('inf'), thresholds[-1][1])
+    char_map = []
+    for row in field:
+        char_row = []
+        for value in row:
+            for threshold, kind in thresholds:
+                if value < threshold:
+                    break
+            char_row.append(kind)
+        char_map.append(char_row)
+    return char_map
+
+
+# Perfect maze carved by a randomized depth-first search. Cells with both coordinates even
+# are rooms, passages are road and walls are stone (expensive, but still passable).
+def maze_map(rows, cols, rng):
+    char_map = [['s'] * cols for _ in range(rows)]
+    char_map[0][0] = 'r'
+    stack = [(0, 0)]
+    while stack:
+        row, col = stack[-1]
+        moves = [(row + d_row, col + d_col, row + d_row // 2, col + d_col // 2)
+                 for d_row, d_col in ((0, -2), (2, 0), (0, 2), (-2, 0))
+                 if 0 <= row + d_row < rows and 0 <= col + d_col < cols and
+                 char_map[row + d_row][col + d_col] == 's']
+        if not moves:
+            stack.pop()
+            continue
+        n_row, n_col, wall_row, wall_col = rng.choice(moves)
+        char_map[wall_row][wall_col] = 'r'
+        char_map[n_row][n_col] = 'r'
+        stack.append((n_row, n_col))
+    return char_map
+
+
+# Mostly stone and water with long straight road and grass corridors between random points.
+def corridors_map(rows, cols, rng):
+    char_map = [[rng.choice('ssssw') for _ in range(cols)] for _ in range(rows)]
+    for _ in range(max(2, (rows + cols) // 4)):
+        kind = rng.choice('rrg')
+        row, col = rng.randrange(rows), rng.randrange(cols)
+        to_row, to_col = rng.randrange(rows), rng.randrange(cols)
+        for c in range(min(col, to_col), max(col, to_col) + 1):
+            char_map[row][c] = kind
+        for r in range(min(row, to_row), max(row, to_row) + 1):
+            char_map[r][to_col] = kind
+    return char_map
+
+
+def pick_position(char_map, rng, rows, cols):
+    for _ in range(100):
+        row, col = rng.randrange(rows), rng.randrange(cols)
+        if char_map[row][col] != 's':
+            return row, col
+    return row, col
+
+
+# return value - (char_map, start, goal): char_map is a list of rows of tile characters, start and goal
+# are (row, col) tuples, see write_map for the file they make
+def generate(rows, cols, kind='noise', seed=None, mix=DEFAULT_MIX):
+    if not (MIN_SIZE <= rows <= MAX_SIZE and MIN_SIZE <= cols <= MAX_SIZE):
+        raise Exception(f'ERR: Map size {rows, cols} is out of range [{MIN_SIZE}, {MAX_SIZE}]!')
+    rng = random.Random(seed)
+    if kind == 'noise':
+        char_map = noise_map(rows, cols, rng, mix)
+    elif kind == 'maze':
+        char_map = maze_map(rows, cols, rng)
+    elif kind == 'corridors':
+        char_map = corridors_map(rows, cols, rng)
+    else:
+        raise Exception(f'ERR: Unknown map kind {kind}! Known kinds are ({", ".join(KINDS)})')
+    if kind == 'maze':
+        # opposite corner rooms
+        start, goal = (0, 0), ((rows - 1) // 2 * 2, (cols - 1) // 2 * 2)
+    else:
+        start = pick_position(char_map, rng, rows, cols)
+        goal = pick_position(char_map, rng, rows, cols)
+    return char_map, start, goal
+
+
+# file names ending with BINARY_SUFFIX get a compiled map (see mapfile.py)
+def write_map(file_name, char_map, start, goal):
+    if file_name.endswith(BINARY_SUFFIX):
+        write_binary_map(file_name, char_map, [('S', *start), ('G', *goal)])
+        return
+    with open(file_name, 'w') as f:
+        f.write(f'{start[0]},{start[1]}\n')
+        f.write(f'{goal[0]},{goal[1]}\n')
+        for row in char_map:
+            f.write(''.join(row))
+            f.write('\n')
+
+
+def parse_mix(text):
+    mix = []
+    for item in text.split(','):
+        kind, _, share = item.partition('=')
+        mix.append((kind.strip(), int(share)))
+    return tuple(mix)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Generate PyTanja maps.')
+    parser.add_argument('output', help='map file to write')
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--cols', type=int, default=100)
+    parser.add_argument('--kind', choices=KINDS, default='noise')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='terrain shares of noise maps from low to high noise, e.g. w=2,g=4,r=3,s=1')
+    args = parser.parse_args(argv)
+    write_map(args.output, *generate(args.rows, args.cols, args.kind, args.seed, args.mix))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
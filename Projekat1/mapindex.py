@@ -0,0 +1,95 @@
+import hashlib
+import struct
+import sys
+from array import array
+
+# Precomputed distance index of one map, stored next to the map file (map0.txt -> map0.txt.idx).
+#
+# File layout (little endian):
+#   header    - magic, version, sha256 of the map file, grid rows, grid cols, landmark count, field count
+#   landmarks - landmark count * u32 grid indices
+#   tables    - landmark count * grid size * u32, d(landmark, x) for every grid cell x
+#   fields    - field count * (u32 goal grid index + grid size * u32), d(x, goal) for every grid cell x
+# The grid size includes the wall border of CostGrid, so the tables load straight into CostGrid indices.
+
+INDEX_SUFFIX = '.idx'
+MAGIC = b'PTIDX'
+VERSION = 1
+HEADER = struct.Struct('<5sB32sIIII')
+
+
+def content_hash(map_name):
+    with open(map_name, 'rb') as f:
+        return hashlib.sha256(f.read()).digest()
+
+
+def index_file(map_name):
+    return map_name + INDEX_SUFFIX
+
+
+def little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+class MapIndex:
+    # landmarks - grid indices, tables - array('I') of d(landmark, x) per landmark
+    # fields - dict goal grid index -> array('I') of d(x, goal), empty for big maps
+    def __init__(self, digest, rows, cols, landmarks, tables, fields=None):
+        self.digest = digest
+        self.rows = rows
+        self.cols = cols
+        self.landmarks = landmarks
+        self.tables = tables
+        self.fields = fields if fields is not None else {}
+
+    # Lower bound of the path cost from source to target (both reachable from the landmarks), the
+    # best of the landmark bounds of landmark_heuristic in search.py.
+    def lower_bound(self, costs, source, target):
+        best = 0
+        for table in self.tables:
+            to_source, to_target = table[source], table[target]
+            best = max(best, to_target - to_source, to_source - costs[source] - to_target + costs[target])
+        return best
+
+    def save(self, file_name):
+        with open(file_name, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.digest, self.rows, self.cols,
+                                len(self.landmarks), len(self.fields)))
+            little_endian(array('I', self.landmarks)).tofile(f)
+            for table in self.tables:
+                little_endian(table).tofile(f)
+            for goal, field in self.fields.items():
+                little_endian(array('I', [goal])).tofile(f)
+                little_endian(field).tofile(f)
+
+    # return value - the stored index, or None if there is none or it was built for different map contents
+    @staticmethod
+    def load(file_name, digest):
+        try:
+            with open(file_name, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, stored_digest, rows, cols, landmark_count, field_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or stored_digest != digest:
+            return None
+        size = (rows + 2) * (cols + 2)
+        if len(data) != HEADER.size + 4 * (landmark_count * (1 + size) + field_count * (1 + size)):
+            return None
+        values = little_endian(array('I', data[HEADER.size:]))
+        landmarks = list(values[:landmark_count])
+        offset = landmark_count
+        tables = []
+        for _ in range(landmark_count):
+            tables.append(values[offset:offset + size])
+            offset += size
+        fields = {}
+        for _ in range(field_count):
+            fields[values[offset]] = values[offset + 1:offset + 1 + size]
+            offset += 1 + size
+        return MapIndex(digest, rows, cols, landmarks, tables, fields)
@@ -0,0 +1,130 @@
+import time
+
+import config
+from search import HEURISTICS, SEARCH_MODES, greedy_walk, ranked_walk
+from searchstats import SearchStats
+
+# Path planning of the agents without pygame. The Agent sprites in sprites.py delegate to these
+# classes, headless tools (benchmark.py) use them directly on a CostGrid.
+# start, goal - grid indices, return value of plan - list of grid indices from start to goal
+# Subclasses implement search, plan wraps it with the instrumentation.
+
+
+class Planner:
+    def __init__(self):
+        # SearchStats of the last plan call
+        self.stats = None
+
+    # Runs search with fresh stats and times it as the search phase. With config.TRACE_FILE set,
+    # every expanded cell is written to that file as a row,col line, in the order of expansion.
+    # With config.HEATMAP set, the stats keep the expansion count and order of every cell.
+    def plan(self, grid, start, goal):
+        self.stats = SearchStats()
+        trace_file = open(config.TRACE_FILE, 'w') if config.TRACE_FILE else None
+        if trace_file is not None:
+            self.stats.trace = lambda index: trace_file.write('%d,%d\n' % grid.position(index))
+        if config.HEATMAP:
+            self.stats.record_expansions(grid.size)
+        start_time = time.perf_counter()
+        try:
+            return self.search(grid, start, goal, self.stats)
+        finally:
+            self.stats.add_time('search', start_time)
+            if trace_file is not None:
+                trace_file.close()
+
+    def search(self, grid, start, goal, stats):
+        pass
+
+    # option - text given after the agent name on the command line (e.g. Bole:alt),
+    # several options are joined with +
+    def configure(self, option):
+        for name in option.split('+'):
+            self.configure_option(name)
+
+    def configure_option(self, name):
+        raise Exception(f'ERR: {type(self).__name__} does not take an option ({name})!')
+
+
+# Rows first, then columns, straight towards the goal.
+class ExamplePlanner(Planner):
+    def search(self, grid, start, goal, stats):
+        path = [start]
+        row, col = grid.position(start)
+        goal_row, goal_col = grid.position(goal)
+        while True:
+            if row != goal_row:
+                row = row + 1 if row < goal_row else row - 1
+            elif col != goal_col:
+                col = col + 1 if col < goal_col else col - 1
+            else:
+                break
+            path.append(grid.index(row, col))
+        stats.count(len(path), len(path))
+        return path
+
+
+class AkiPlanner(Planner):
+    def search(self, grid, start, goal, stats):
+        return greedy_walk(grid, start, goal, stats)
+
+
+class JockePlanner(Planner):
+    def search(self, grid, start, goal, stats):
+        return ranked_walk(grid, start, goal, stats, config.DEBUG)
+
+
+# Planners that use one of the engines from search.py.
+# Options (joined with +, e.g. Bole:alt+bidirectional) select the heuristic and the search mode.
+class SearchPlanner(Planner):
+    heuristics = ('none',)
+
+    def __init__(self, heuristic='none'):
+        super().__init__()
+        self.heuristic = heuristic
+        self.mode = 'forward'
+
+    def configure_option(self, name):
+        if name in self.heuristics:
+            self.heuristic = name
+        elif name in SEARCH_MODES:
+            self.mode = name
+        else:
+            raise Exception(f'ERR: Unknown option {name}! Known options are '
+                            f'({", ".join(self.heuristics + tuple(SEARCH_MODES.keys()))})')
+
+    def search(self, grid, start, goal, stats):
+        return SEARCH_MODES[self.mode](grid, start, goal, HEURISTICS[self.heuristic], stats)
+
+
+class DrazaPlanner(SearchPlanner):
+    def __init__(self):
+        super().__init__()
+
+
+class BolePlanner(SearchPlanner):
+    heuristics = tuple(HEURISTICS.keys())
+
+    def __init__(self):
+        super().__init__('manhattan')
+
+
+# agent name -> planner class
+PLANNERS = {
+    'ExampleAgent': ExamplePlanner,
+    'Aki': AkiPlanner,
+    'Jocke': JockePlanner,
+    'Draza': DrazaPlanner,
+    'Bole': BolePlanner,
+}
+
+
+# agent_spec - agent name optionally followed by options, e.g. Bole:alt+bidirectional
+def create_planner(agent_spec):
+    agent_name, _, option = agent_spec.partition(':')
+    if agent_name not in PLANNERS:
+        raise Exception(f'ERR: Unknown agent {agent_name}! Known agents are ({", ".join(PLANNERS)})')
+    planner = PLANNERS[agent_name]()
+    if option:
+        planner.configure(option)
+    return planner
@@ -0,0 +1,187 @@
+import heapq
+import time
+from array import array
+
+from searchstats import make_heuristic, trace_of
+
+# Rectangular symmetry reduction for 4-connected grids with weighted tiles.
+#
+# The grid is split into rectangles of one tile kind. Inside such a rectangle every monotone path
+# between two cells costs the same (manhattan distance * tile cost), so the search can skip the
+# interior cells: it only expands cells on the rectangle borders (and everything outside of the
+# rectangles), plus macro edges that jump straight across a rectangle to the opposite border.
+# Any optimal path through an interior can be replaced by an equally expensive one that walks along
+# the border and jumps across, so the reduced search stays exact.
+#
+# The mode pays off on maps made of large areas of one tile kind (e.g. mapgen.py --mix g=1), where
+# most cells are interior. On the default noise, maze and corridor maps the rectangles are small,
+# the decomposition and the macro edges cost more than the skipped cells save, and plain Draza or
+# Bole is faster.
+
+MIN_SIDE = 3
+MAX_SIDE = 64
+UNREACHABLE = 2 ** 32 - 1
+
+
+class Rectangles:
+    def __init__(self, grid):
+        self.grid = grid
+        # rectangle id of every cell, -1 for cells outside of the rectangles
+        self.ids = array('i', [-1]) * grid.size
+        # 1 for the interior (non border) cells of the rectangles
+        self.interior = bytearray(grid.size)
+        # (top, left, bottom, right, cost) in padded grid rows/cols
+        self.bounds = []
+        self._decompose()
+
+    # Greedy decomposition - from every free cell in row major order grow a rectangle of the same cost,
+    # first to the right and then down, and keep it if it has interior cells.
+    def _decompose(self):
+        grid, costs, ids = self.grid, self.grid.costs, self.ids
+        width = grid.width
+        for row in range(1, grid.rows + 1):
+            for col in range(1, grid.cols + 1):
+                index = row * width + col
+                if ids[index] >= 0:
+                    continue
+                cost = costs[index]
+                right = col
+                while right - col + 1 < MAX_SIDE and costs[index + right - col + 1] == cost and \
+                        ids[index + right - col + 1] < 0:
+                    right += 1
+                if right - col + 1 < MIN_SIDE:
+                    continue
+                span = right - col + 1
+                bottom = row
+                while bottom - row + 1 < MAX_SIDE and bottom < grid.rows:
+                    start = (bottom + 1) * width + col
+                    if any(costs[i] != cost or ids[i] >= 0 for i in range(start, start + span)):
+                        break
+                    bottom += 1
+                if bottom - row + 1 < MIN_SIDE:
+                    continue
+                rectangle_id = len(self.bounds)
+                self.bounds.append((row, col, bottom, right, cost))
+                for r in range(row, bottom + 1):
+                    start = r * width + col
+                    ids[start:start + span] = array('i', [rectangle_id]) * span
+                    if row < r < bottom:
+                        self.interior[start + 1:start + span - 1] = b'\x01' * (span - 2)
+
+    # Macro edges from a cell that is not interior: jump across its rectangle from a side cell
+    # (corners need none, their straight lines run along the border).
+    def jumps(self, index):
+        rectangle_id = self.ids[index]
+        if rectangle_id < 0:
+            return ()
+        top, left, bottom, right, cost = self.bounds[rectangle_id]
+        row, col = divmod(index, self.grid.width)
+        if top < row < bottom:
+            if col == left:
+                return (row * self.grid.width + right, (right - left) * cost),
+            return (row * self.grid.width + left, (right - left) * cost),
+        if left < col < right:
+            if row == top:
+                return (bottom * self.grid.width + col, (bottom - top) * cost),
+            return (top * self.grid.width + col, (bottom - top) * cost),
+        return ()
+
+    # Edges from an interior cell straight to the four borders of its rectangle.
+    def exits(self, index):
+        top, left, bottom, right, cost = self.bounds[self.ids[index]]
+        width = self.grid.width
+        row, col = divmod(index, width)
+        return ((row * width + left, (col - left) * cost), (bottom * width + col, (bottom - row) * cost),
+                (row * width + right, (right - col) * cost), (top * width + col, (row - top) * cost))
+
+    # Cost of the monotone path between two cells of the same rectangle.
+    def distance(self, index, other):
+        width = self.grid.width
+        row, col = divmod(index, width)
+        other_row, other_col = divmod(other, width)
+        return (abs(row - other_row) + abs(col - other_col)) * self.bounds[self.ids[index]][4]
+
+
+def rectangles_of(grid):
+    rectangles = grid.cache.get('rectangles')
+    if rectangles is None:
+        rectangles = grid.cache['rectangles'] = Rectangles(grid)
+    return rectangles
+
+
+# Cells walked from index (excluded) to other (included): along the row first, then along the column.
+def _walk(index, other, width):
+    row, col = divmod(index, width)
+    other_row, other_col = divmod(other, width)
+    step = 1 if other_col > col else -1
+    cells = [row * width + c for c in range(col + step, other_col + step, step)]
+    step = 1 if other_row > row else -1
+    cells.extend(r * width + other_col for r in range(row + step, other_row + step, step))
+    return cells
+
+
+# A* over the reduced graph, same contract as the other SEARCH_MODES in search.py.
+def rectangle_search(grid, start, goal, heuristic_factory, stats=None):
+    start_time = time.perf_counter()
+    rectangles = rectangles_of(grid)
+    if stats is not None:
+        stats.add_time('rectangles', start_time)
+    costs, offsets, width = grid.costs, grid.offsets, grid.width
+    ids, interior = rectangles.ids, rectangles.interior
+    goal_rectangle = ids[goal] if interior[goal] else -1
+    heuristic = make_heuristic(heuristic_factory, grid, goal, stats)
+    best_cost = {start: 0}
+    parent = {start: None}
+    closed = set()
+    start_h = heuristic(start)
+    frontier = [(start_h, start_h, 0, start)]
+    counter = 1
+    peak = 1
+    trace = trace_of(stats)
+    found = False
+    while frontier:
+        if len(frontier) > peak:
+            peak = len(frontier)
+        index = heapq.heappop(frontier)[3]
+        if index in closed:
+            continue
+        if index == goal:
+            found = True
+            break
+        closed.add(index)
+        if trace is not None:
+            trace(index)
+        cost = best_cost[index]
+        if interior[index]:
+            # only the start cell can be interior
+            edges = list(rectangles.exits(index))
+        else:
+            edges = [(index + offset, costs[index + offset]) for offset in offsets
+                     if costs[index + offset] and (not interior[index + offset] or index + offset == goal)]
+            edges.extend(rectangles.jumps(index))
+        if goal_rectangle >= 0 and ids[index] == goal_rectangle:
+            edges.append((goal, rectangles.distance(index, goal)))
+        for neighbour, step in edges:
+            if neighbour in closed:
+                continue
+            new_cost = cost + step
+            if new_cost < best_cost.get(neighbour, UNREACHABLE):
+                best_cost[neighbour] = new_cost
+                parent[neighbour] = index
+                h = heuristic(neighbour)
+                heapq.heappush(frontier, (new_cost + h, h, counter, neighbour))
+                counter += 1
+    if stats is not None:
+        stats.count(len(closed), counter, peak)
+    if not found:
+        return []
+    nodes = []
+    index = goal
+    while index is not None:
+        nodes.append(index)
+        index = parent[index]
+    nodes.reverse()
+    path = [start]
+    for index, other in zip(nodes, nodes[1:]):
+        path.extend(_walk(index, other, width))
+    return path
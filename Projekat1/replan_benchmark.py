@@ -0,0 +1,94 @@
+import argparse
+import random
+import sys
+import time
+
+from benchmark import write_results
+from dstar import DStarLite
+from grid import CostGrid, TILE_COSTS
+from mapfile import load_map
+from search import a_star, manhattan_heuristic
+from searchstats import SearchStats
+
+FIELDS = ('map', 'rows', 'cols', 'updates', 'changes', 'dstar_time', 'replan_time', 'speedup',
+          'dstar_expanded', 'replan_expanded', 'initial_time')
+
+
+# The agent walks the planned route; every `every` steps `changes` tiles on or next to the rest of the
+# route get a random new kind. The path is then repaired with D* Lite and, for comparison, planned
+# again from scratch with A* (the Bole default). Both have to agree on the path cost.
+# The repair always expands fewer cells, but a repaired cell costs more than an A* one, so it does
+# not always win. It loses where A* finds the route with few expansions anyway, and after changes
+# near the goal: D* Lite searches from the goal, so those changes reach the g values of most cells
+# it knows.
+def run_map(map_name, every, changes, seed=None):
+    rng = random.Random(seed)
+    char_map, start_row, start_col, goal_row, goal_col = load_map(map_name)
+    grid = CostGrid.from_char_map(char_map)
+    start, goal = grid.index(start_row, start_col), grid.index(goal_row, goal_col)
+    new_costs = sorted(set(TILE_COSTS.values()))
+    dstar_stats = SearchStats()
+    replan_stats = SearchStats()
+    start_time = time.perf_counter()
+    dstar = DStarLite(grid, start, goal, dstar_stats)
+    path = dstar.path()
+    initial_time = time.perf_counter() - start_time
+    dstar_stats.nodes_expanded = 0
+    updates = 0
+    dstar_time = replan_time = 0.0
+    while len(path) > every + 1:
+        start = path[every]
+        dstar.move_to(start)
+        ahead = path[every:]
+        cells = []
+        for _ in range(changes):
+            cell = rng.choice(ahead) + rng.choice((0,) + grid.offsets)
+            if grid.costs[cell]:
+                grid.set_cost(*grid.position(cell), rng.choice(new_costs))
+                cells.append(cell)
+        start_time = time.perf_counter()
+        dstar.update_cells(cells)
+        path = dstar.path()
+        dstar_time += time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        replanned = a_star(grid, start, goal, manhattan_heuristic(grid, goal), replan_stats)
+        replan_time += time.perf_counter() - start_time
+        if sum(grid.costs[index] for index in path[1:]) != sum(grid.costs[index] for index in replanned[1:]):
+            raise Exception(f'ERR: Repaired path on {map_name} is not a cheapest one!')
+        updates += 1
+    return {
+        'map': map_name,
+        'rows': grid.rows,
+        'cols': grid.cols,
+        'updates': updates,
+        'changes': changes,
+        'dstar_time': round(dstar_time, 6),
+        'replan_time': round(replan_time, 6),
+        'speedup': round(replan_time / dstar_time, 3) if dstar_time else None,
+        'dstar_expanded': dstar_stats.nodes_expanded,
+        'replan_expanded': replan_stats.nodes_expanded,
+        'initial_time': round(initial_time, 6),
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compare D* Lite path repairs with full replanning '
+                                                 'while tile costs change along the route.')
+    parser.add_argument('maps', nargs='+', help='map files')
+    parser.add_argument('--every', type=int, default=5, help='steps walked between two cost updates')
+    parser.add_argument('--changes', type=int, default=3, help='tiles changed per update')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-f', '--format', choices=('csv', 'json'), default='csv')
+    parser.add_argument('-o', '--output', help='output file (default: standard output)')
+    args = parser.parse_args(argv)
+
+    results = (run_map(map_name, args.every, args.changes, args.seed) for map_name in args.maps)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_results(results, f, args.format, FIELDS)
+    else:
+        write_results(results, sys.stdout, args.format, FIELDS)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
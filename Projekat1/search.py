@@ -0,0 +1,480 @@
+import heapq
+import time
+from array import array
+from collections import deque
+
+from hpa import exact_hpa_search, hpa_search
+from mapindex import MapIndex, content_hash, index_file
+from rectangles import rectangle_search
+from searchstats import make_heuristic, trace_of
+
+# cost of the cheapest tile (Road) - one step never costs less than this
+MIN_TILE_COST = 2
+LANDMARK_COUNT = 4
+# maps up to this many cells get a full distance field for every goal in their index
+ALL_PAIRS_MAX_CELLS = 1024
+UNREACHABLE = 2 ** 32 - 1
+# surrounding cost of a cell without neighbours
+NO_NEIGHBOURS_COST = 1500
+
+
+# All searches work on a CostGrid (see grid.py) and address cells by their grid index.
+
+def rebuild_path(parent, index):
+    path = []
+    while index is not None:
+        path.append(index)
+        index = parent[index]
+    path.reverse()
+    return path
+
+
+# Cost of the cheapest path from source to every cell (the source cell itself is free),
+# or with reverse=True from every cell to source.
+def distance_table(grid, source, reverse=False):
+    costs, offsets = grid.costs, grid.offsets
+    distances = array('I', [UNREACHABLE]) * grid.size
+    distances[source] = 0
+    frontier = [(0, source)]
+    while frontier:
+        cost, index = heapq.heappop(frontier)
+        if cost > distances[index]:
+            continue
+        # walking backward the step costs the cell that is left, not the one entered
+        backward_step = costs[index]
+        for offset in offsets:
+            neighbour = index + offset
+            step = costs[neighbour]
+            if not step:
+                continue
+            new_cost = cost + (backward_step if reverse else step)
+            if new_cost < distances[neighbour]:
+                distances[neighbour] = new_cost
+                heapq.heappush(frontier, (new_cost, neighbour))
+    return distances
+
+
+# Heuristics - each factory takes the grid and the target index and returns h(index),
+# a lower bound of the path cost from index to the target
+# (or from the target to index, for reverse=True, used by backward searches).
+# All of them are consistent, so A* with a closed set stays optimal.
+
+def zero_heuristic(grid, target, reverse=False):
+    return lambda index: 0
+
+
+def manhattan_heuristic(grid, target, reverse=False):
+    width = grid.width
+    target_row, target_col = divmod(target, width)
+
+    def heuristic(index):
+        row, col = divmod(index, width)
+        return (abs(row - target_row) + abs(col - target_col)) * MIN_TILE_COST
+    return heuristic
+
+
+# Landmarks are picked one by one as the cell farthest from the ones already picked,
+# starting from the cell farthest from the top left one.
+def select_landmarks(grid, count=LANDMARK_COUNT):
+    closest = distance_table(grid, grid.index(0, 0))
+    landmarks, tables = [], []
+    while len(landmarks) < count:
+        landmark = max((cost, index) for index, cost in enumerate(closest) if cost != UNREACHABLE)[1]
+        if landmark in landmarks:
+            break
+        table = distance_table(grid, landmark)
+        closest = table if not landmarks else array('I', map(min, closest, table))
+        landmarks.append(landmark)
+        tables.append(table)
+    return landmarks, tables
+
+
+# ALT (A*, landmarks, triangle inequality). For a landmark L and d(L, x) known for every x:
+#   d(x, t) >= d(L, t) - d(L, x)
+#   d(x, t) >= d(x, L) - d(t, L), where d(x, L) = d(L, x) - cost(x) + cost(L)
+# since a path walked backwards pays for its first cell instead of its last one.
+# Swapping x and t gives the bounds of d(t, x) for the reverse heuristic.
+def landmark_heuristic(grid, target, reverse=False):
+    costs = grid.costs
+    # (d(L, x) for every x, d(L, t), d(L, t) - cost(t))
+    bounds = [(table, table[target], table[target] - costs[target]) for table in index_of(grid).tables]
+    manhattan = manhattan_heuristic(grid, target)
+
+    def heuristic(index):
+        best = manhattan(index)
+        cell_cost = costs[index]
+        for table, to_target, shifted in bounds:
+            from_landmark = table[index]
+            best = max(best, to_target - from_landmark, from_landmark - cell_cost - shifted)
+        return best
+
+    def reverse_heuristic(index):
+        best = manhattan(index)
+        cell_cost = costs[index]
+        for table, to_target, shifted in bounds:
+            from_landmark = table[index]
+            best = max(best, from_landmark - to_target, shifted - from_landmark + cell_cost)
+        return best
+    return reverse_heuristic if reverse else heuristic
+
+
+def build_index(grid, digest=None):
+    landmarks, tables = select_landmarks(grid)
+    fields = {}
+    if grid.rows * grid.cols <= ALL_PAIRS_MAX_CELLS:
+        for row in range(grid.rows):
+            for col in range(grid.cols):
+                goal = grid.index(row, col)
+                fields[goal] = distance_table(grid, goal, reverse=True)
+    return MapIndex(digest, grid.rows, grid.cols, landmarks, tables, fields)
+
+
+# Distance index of the grid - loaded from the file next to the map the grid was read from when it
+# still matches the map contents, otherwise built and stored there for the next run.
+def index_of(grid):
+    index = grid.cache.get('index')
+    if index is not None:
+        return index
+    if grid.source is None:
+        index = build_index(grid)
+    else:
+        digest = content_hash(grid.source)
+        index = MapIndex.load(index_file(grid.source), digest)
+        if index is None or (index.rows, index.cols) != (grid.rows, grid.cols):
+            index = build_index(grid, digest)
+            try:
+                index.save(index_file(grid.source))
+            except OSError:
+                pass
+    grid.cache['index'] = index
+    return index
+
+
+HEURISTICS = {
+    'none': zero_heuristic,
+    'manhattan': manhattan_heuristic,
+    'alt': landmark_heuristic,
+}
+
+
+# A* over a cost grid.
+# start, goal - grid indices
+# heuristic - h(index), defaults to 0 which makes this a uniform-cost search
+# stats - optional SearchStats to update
+# return value - list of grid indices from start to goal (empty if the goal is unreachable)
+def a_star(grid, start, goal, heuristic=None, stats=None):
+    if heuristic is None:
+        heuristic = zero_heuristic(grid, goal)
+    costs, offsets = grid.costs, grid.offsets
+    best_cost = {start: 0}
+    parent = {start: None}
+    closed = set()
+    # (f, h, insertion order, index) - prefer deeper nodes on equal f, then FIFO
+    start_h = heuristic(start)
+    frontier = [(start_h, start_h, 0, start)]
+    counter = 1
+    peak = 1
+    trace = trace_of(stats)
+    path = []
+    while frontier:
+        if len(frontier) > peak:
+            peak = len(frontier)
+        index = heapq.heappop(frontier)[3]
+        if index in closed:
+            # stale entry, the cell was already expanded with a lower cost
+            continue
+        if index == goal:
+            path = rebuild_path(parent, index)
+            break
+        closed.add(index)
+        if trace is not None:
+            trace(index)
+        cost = best_cost[index]
+        for offset in offsets:
+            neighbour = index + offset
+            step = costs[neighbour]
+            if not step or neighbour in closed:
+                continue
+            new_cost = cost + step
+            if new_cost < best_cost.get(neighbour, UNREACHABLE):
+                best_cost[neighbour] = new_cost
+                parent[neighbour] = index
+                h = heuristic(neighbour)
+                heapq.heappush(frontier, (new_cost + h, h, counter, neighbour))
+                counter += 1
+    if stats is not None:
+        stats.count(len(closed), counter, peak)
+    return path
+
+
+def forward_search(grid, start, goal, heuristic_factory=zero_heuristic, stats=None):
+    return a_star(grid, start, goal, make_heuristic(heuristic_factory, grid, goal, stats), stats)
+
+
+# Bidirectional A* - one search runs forward from start, the other backward from goal over the
+# reversed edges (stepping back from v to u costs cost(v), the price of entering v from u).
+# Both use the average of the two heuristics, p(x) = (h_forward(x) - h_backward(x)) / 2, so they
+# work with the same consistent potential and the Dijkstra stopping rule stays valid: stop when the
+# smallest keys of the two frontiers add up to the cost mu of the best meeting found so far.
+# Keys are doubled to stay integer: 2 * g + h_forward - h_backward forward, 2 * g - h_forward + h_backward backward.
+# heuristic_factory - one of HEURISTICS, called for both directions
+# return value - list of grid indices from start to goal (empty if the goal is unreachable)
+def bidirectional_search(grid, start, goal, heuristic_factory=zero_heuristic, stats=None):
+    costs, offsets = grid.costs, grid.offsets
+    if start == goal:
+        return [start]
+    to_goal = make_heuristic(heuristic_factory, grid, goal, stats)
+    from_start = make_heuristic(heuristic_factory, grid, start, stats, reverse=True)
+    potentials = (lambda index: to_goal(index) - from_start(index),
+                  lambda index: from_start(index) - to_goal(index))
+    # forward: g = cost from start, parent = previous cell; backward: g = cost to goal, parent = next cell
+    best_costs = ({start: 0}, {goal: 0})
+    parents = ({start: None}, {goal: None})
+    closed = (set(), set())
+    frontiers = ([(potentials[0](start), 0, start)], [(potentials[1](goal), 0, goal)])
+    mu = UNREACHABLE
+    meeting = None
+    generated = peak = 2
+    trace = trace_of(stats)
+    while frontiers[0] and frontiers[1]:
+        if frontiers[0][0][0] + frontiers[1][0][0] >= 2 * mu:
+            break
+        peak = max(peak, len(frontiers[0]) + len(frontiers[1]))
+        # expand the direction with the smaller frontier
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        _, cost, index = heapq.heappop(frontiers[side])
+        if index in closed[side]:
+            continue
+        closed[side].add(index)
+        if trace is not None:
+            trace(index)
+        best_cost, other_cost = best_costs[side], best_costs[1 - side]
+        parent, potential, frontier = parents[side], potentials[side], frontiers[side]
+        # going forward a step costs the entered neighbour, going backward the cell left behind
+        backward_step = costs[index]
+        for offset in offsets:
+            neighbour = index + offset
+            step = costs[neighbour]
+            if not step or neighbour in closed[side]:
+                continue
+            new_cost = cost + (backward_step if side else step)
+            if new_cost < best_cost.get(neighbour, UNREACHABLE):
+                best_cost[neighbour] = new_cost
+                parent[neighbour] = index
+                heapq.heappush(frontier, (2 * new_cost + potential(neighbour), new_cost, neighbour))
+                generated += 1
+                if neighbour in other_cost and new_cost + other_cost[neighbour] < mu:
+                    mu = new_cost + other_cost[neighbour]
+                    meeting = neighbour
+    if stats is not None:
+        # a cell expanded from both sides counts once per side
+        stats.count(len(closed[0]) + len(closed[1]), generated, peak)
+    if meeting is None:
+        return []
+    path = rebuild_path(parents[0], meeting)
+    index = parents[1][meeting]
+    while index is not None:
+        path.append(index)
+        index = parents[1][index]
+    return path
+
+
+# Query answered from the distance index: small maps store d(x, goal) for every goal, so the path is
+# read off the table (see field_path). Bigger maps
+# fall back to A* guided by the stored landmarks, whatever heuristic was asked for.
+def index_search(grid, start, goal, heuristic_factory=zero_heuristic, stats=None):
+    start_time = time.perf_counter()
+    index = index_of(grid)
+    if stats is not None:
+        stats.add_time('index', start_time)
+    field = index.fields.get(goal)
+    if field is None:
+        return a_star(grid, start, goal, make_heuristic(landmark_heuristic, grid, goal, stats), stats)
+    return field_path(grid, field, start, goal, stats)
+
+
+# Path read off a table of d(x, goal) (distance_table with reverse=True) by always stepping to the
+# neighbour that lies on a cheapest path.
+def field_path(grid, field, start, goal, stats=None):
+    if field[start] == UNREACHABLE:
+        return []
+    costs, offsets = grid.costs, grid.offsets
+    trace = trace_of(stats)
+    path = [start]
+    current = start
+    while current != goal:
+        if trace is not None:
+            trace(current)
+        remaining = field[current]
+        for offset in offsets:
+            neighbour = current + offset
+            if costs[neighbour] and field[neighbour] + costs[neighbour] == remaining:
+                current = neighbour
+                break
+        path.append(current)
+    if stats is not None:
+        stats.count(len(path) - 1, len(path) - 1)
+    return path
+
+
+# Surrounding cost of every cell - the average (rounded down) cost of its neighbours, computed a whole
+# row at a time from the cost array shifted by each of the four offsets.
+def surrounding_costs(grid):
+    field = grid.cache.get('surrounding')
+    if field is None:
+        costs, width, cols = grid.costs, grid.width, grid.cols
+        field = array('H', [0]) * grid.size
+        for row in range(1, grid.rows + 1):
+            start = row * width + 1
+            end = start + cols
+            field[start:end] = array('H', map(_average_cost, costs[start - 1:end - 1], costs[start + width:end + width],
+                                              costs[start + 1:end + 1], costs[start - width:end - width]))
+        grid.cache['surrounding'] = field
+    return field
+
+
+def _average_cost(*neighbour_costs):
+    count = len(neighbour_costs) - neighbour_costs.count(0)
+    return sum(neighbour_costs) // count if count else NO_NEIGHBOURS_COST
+
+
+# Cells walked between two nodes of a search tree: up from prev to the common ancestor, then down to next.
+# order - discovery rank of every node, ancestors always rank lower than their descendants
+def tree_walk(parent, order, prev, next_cell):
+    up, down = [], []
+    ancestor, other = prev, parent[next_cell]
+    while ancestor != other:
+        if order[ancestor] < order[other]:
+            down.append(other)
+            other = parent[other]
+        else:
+            up.append(ancestor)
+            ancestor = parent[ancestor]
+    walk = up[1:] + [ancestor] if up else []
+    walk.extend(reversed(down))
+    walk.append(next_cell)
+    return walk
+
+
+# Tree search that physically walks the agent from node to node. Nodes are taken in the order they
+# were discovered (a FIFO queue, as the original Jocke did); the children of a node are discovered
+# cheapest surrounding cost first.
+# return value - the walked cells from start to goal, consecutive cells are always adjacent
+def ranked_walk(grid, start, goal, stats=None, debug=False):
+    costs, offsets = grid.costs, grid.offsets
+    start_time = time.perf_counter()
+    surrounding = surrounding_costs(grid)
+    if stats is not None:
+        stats.add_time('surrounding costs', start_time)
+    trace = trace_of(stats)
+    parent = {start: None}
+    order = {start: 0}
+    # discovered cells not expanded yet, in the order of discovery
+    frontier = deque()
+    path = [start]
+    current = start
+    expanded = peak = walked_again = 0
+    while current != goal:
+        if trace is not None:
+            trace(current)
+        children = [current + offset for offset in offsets
+                    if costs[current + offset] and current + offset not in order]
+        # exchange sort, not sorted(): it is not stable, and its order of equal costs is the one the
+        # original Jocke walked
+        for i in range(len(children) - 1):
+            for j in range(i + 1, len(children)):
+                if surrounding[children[i]] > surrounding[children[j]]:
+                    children[i], children[j] = children[j], children[i]
+        for child in children:
+            order[child] = len(order)
+            parent[child] = current
+            frontier.append(child)
+        expanded += 1
+        peak = max(peak, len(frontier))
+        if debug:
+            print('heap', len(frontier))
+        if not frontier:
+            path = []
+            break
+        next_cell = frontier.popleft()
+        walk = tree_walk(parent, order, current, next_cell)
+        walked_again += len(walk) - 1
+        path.extend(walk)
+        current = next_cell
+    if stats is not None:
+        stats.count(expanded, len(order), peak, walked_again)
+    return path
+
+
+# Shortest route (in steps) from source to target over the visited cells, the cells walked after source
+def _visited_route(grid, visited, source, target):
+    parent = {source: None}
+    queue = deque([source])
+    while queue:
+        index = queue.popleft()
+        if index == target:
+            break
+        for offset in grid.offsets:
+            neighbour = index + offset
+            if visited[neighbour] and neighbour not in parent:
+                parent[neighbour] = index
+                queue.append(neighbour)
+    route = []
+    while target != source:
+        route.append(target)
+        target = parent[target]
+    route.reverse()
+    return route
+
+
+# Greedy walk - always steps to the cheapest unvisited neighbour (ties go to the last of west, south,
+# east, north). A stuck walker walks back over visited cells, one cell at a time, to the latest cell
+# on its stack of forward steps that still has an unvisited neighbour.
+# return value - the walked cells, starting with start, consecutive cells are always adjacent
+def greedy_walk(grid, start, goal, stats=None):
+    costs, offsets = grid.costs, grid.offsets
+    visited = bytearray(grid.size)
+    visited[start] = 1
+    path = [start]
+    # forward steps, the cells the walker can still backtrack to
+    stack = [start]
+    current = start
+    trace = trace_of(stats)
+    while current != goal:
+        if trace is not None:
+            trace(current)
+        next_move = None
+        next_move_cost = UNREACHABLE
+        for offset in offsets:
+            neighbour = current + offset
+            if costs[neighbour] and not visited[neighbour] and costs[neighbour] <= next_move_cost:
+                next_move = neighbour
+                next_move_cost = costs[neighbour]
+        if next_move is not None:
+            visited[next_move] = 1
+            stack.append(next_move)
+            path.append(next_move)
+        else:
+            while stack and not any(costs[stack[-1] + offset] and not visited[stack[-1] + offset]
+                                    for offset in offsets):
+                stack.pop()
+            if not stack:
+                break
+            next_move = stack[-1]
+            path.extend(_visited_route(grid, visited, current, next_move))
+        current = next_move
+    if stats is not None:
+        forward_steps = sum(visited)
+        # no frontier, only the cells around the walker
+        stats.count(len(path), forward_steps, reexpansions=len(path) - forward_steps)
+    return path
+
+
+SEARCH_MODES = {
+    'forward': forward_search,
+    'bidirectional': bidirectional_search,
+    'rectangles': rectangle_search,
+    'index': index_search,
+    'hpa': hpa_search,
+    'hpa-exact': exact_hpa_search,
+}
@@ -0,0 +1,71 @@
+import time
+from array import array
+
+
+class SearchStats:
+    def __init__(self):
+        self.nodes_expanded = 0
+        # nodes put on a frontier (or marked visited, for the walkers)
+        self.nodes_generated = 0
+        # most entries a frontier held at once, stale heap entries included
+        self.peak_frontier = 0
+        # expansions of nodes that had been expanded before (cells walked again, D* Lite repairs)
+        self.reexpansions = 0
+        # upper bound of path cost / optimal path cost, 1 for searches that are exact
+        self.suboptimality_bound = 1.0
+        # phase name -> seconds spent in it, the search phase (see planners.py) includes the others
+        self.phase_times = {}
+        # optional trace(index), called with every expanded cell in the order of expansion
+        self.trace = None
+        # grid index -> times the cell was expanded / number of its first expansion (0 - not expanded),
+        # only kept after record_expansions
+        self.expansion_counts = None
+        self.expansion_order = None
+
+    def count(self, expanded, generated, peak_frontier=0, reexpansions=0):
+        self.nodes_expanded += expanded
+        self.nodes_generated += generated
+        self.peak_frontier = max(self.peak_frontier, peak_frontier)
+        self.reexpansions += reexpansions
+
+    # start_time - time.perf_counter() when the phase started
+    def add_time(self, phase, start_time):
+        self.phase_times[phase] = self.phase_times.get(phase, 0.0) + time.perf_counter() - start_time
+
+    # Fills expansion_counts and expansion_order through the trace (an earlier trace is still called).
+    # size - number of cells of the grid
+    def record_expansions(self, size):
+        counts = self.expansion_counts = array('I', [0]) * size
+        order = self.expansion_order = array('I', [0]) * size
+        previous = self.trace
+        number = 0
+
+        def record(index):
+            nonlocal number
+            number += 1
+            if not counts[index]:
+                order[index] = number
+            counts[index] += 1
+            if previous is not None:
+                previous(index)
+        self.trace = record
+
+    def __str__(self):
+        phases = ', '.join(f'{phase} {seconds:.6f}s' for phase, seconds in self.phase_times.items())
+        return (f'expanded {self.nodes_expanded}, generated {self.nodes_generated}, '
+                f'peak frontier {self.peak_frontier}, re-expanded {self.reexpansions}, '
+                f'suboptimality bound {self.suboptimality_bound:.3f}' + (f', {phases}' if phases else ''))
+
+
+# trace function of an optional SearchStats, None without one
+def trace_of(stats):
+    return stats.trace if stats is not None else None
+
+
+# heuristic_factory(grid, target, reverse), timed as the heuristic phase of stats
+def make_heuristic(heuristic_factory, grid, target, stats=None, reverse=False):
+    start_time = time.perf_counter()
+    heuristic = heuristic_factory(grid, target, reverse)
+    if stats is not None:
+        stats.add_time('heuristic', start_time)
+    return heuristic
@@ -1,32 +1,58 @@
 import pygame
 import os
 import config
-import math
+import time
+from functools import lru_cache
 
+from grid import grid_of
+from planners import AkiPlanner, BolePlanner, DrazaPlanner, ExamplePlanner, JockePlanner, Planner
 
+
+# The image is loaded (and the rect placed) the first time the sprite is drawn or moved,
+# so sprites can be created before the display is set up, or without one at all.
 class BaseSprite(pygame.sprite.Sprite):
     images = dict()
 
     def __init__(self, row, col, file_name, transparent_color=None):
         pygame.sprite.Sprite.__init__(self)
-        if file_name in BaseSprite.images:
-            self.image = BaseSprite.images[file_name]
-        else:
-            self.image = pygame.image.load(os.path.join(config.IMG_FOLDER, file_name)).convert()
-            self.image = pygame.transform.scale(self.image, (config.TILE_SIZE, config.TILE_SIZE))
-            BaseSprite.images[file_name] = self.image
-        # making the image transparent (if needed)
-        if transparent_color:
-            self.image.set_colorkey(transparent_color)
-        self.rect = self.image.get_rect()
-        self.rect.topleft = (col * config.TILE_SIZE, row * config.TILE_SIZE)
+        self.file_name = file_name
+        self.transparent_color = transparent_color
+        self._image = None
+        self._rect = None
         self.row = row
         self.col = col
 
-
+    @property
+    def image(self):
+        if self._image is None:
+            if self.file_name in BaseSprite.images:
+                self._image = BaseSprite.images[self.file_name]
+            else:
+                self._image = pygame.image.load(os.path.join(config.IMG_FOLDER, self.file_name)).convert()
+                self._image = pygame.transform.scale(self._image, (config.TILE_SIZE, config.TILE_SIZE))
+                BaseSprite.images[self.file_name] = self._image
+            # making the image transparent (if needed)
+            if self.transparent_color:
+                self._image.set_colorkey(self.transparent_color)
+        return self._image
+
+    @property
+    def rect(self):
+        if self._rect is None:
+            self._rect = self.image.get_rect()
+            self._rect.topleft = (self.col * config.TILE_SIZE, self.row * config.TILE_SIZE)
+        return self._rect
+
+
+# Sprite of an agent, the path planning is done by its planner (see planners.py).
 class Agent(BaseSprite):
+    planner_class = Planner
+
     def __init__(self, row, col, file_name):
         super(Agent, self).__init__(row, col, file_name, config.DARK_GREEN)
+        self.planner = self.planner_class()
+        # SearchStats of the last get_agent_path call, None for agents that do not collect them
+        self.stats = None
 
     def move_towards(self, row, col):
         row = row - self.row
@@ -44,255 +70,60 @@ class Agent(BaseSprite):
     # goal - (row, col)
     # return value - list of elements of type Tile
     def get_agent_path(self, game_map, goal):
-        pass
-
+        grid = grid_of(game_map)
+        path = self.planner.plan(grid, grid.index(self.row, self.col), grid.index(*goal))
+        self.stats = self.planner.stats
+        if path is None:
+            return None
+        start_time = time.perf_counter()
+        tiles = Agent.path_tiles(game_map, grid, path)
+        self.stats.add_time('tiles', start_time)
+        return tiles
+
+    # option - text given after the agent name on the command line (e.g. Bole:alt),
+    # several options are joined with +
+    def configure(self, option):
+        self.planner.configure(option)
+
+    # path - list of grid indices, return value - list of the matching tiles of game_map
     @staticmethod
-    def check_bounds(position, bounds):
-        if(all([x >= 0 for x in position])):
-            if(position[0]<bounds[0] and position[1]<bounds[1]):
-                return True
-        else:
-            return False
+    def path_tiles(game_map, grid, path):
+        return [game_map[row][col] for row, col in map(grid.position, path)]
 
 
 class ExampleAgent(Agent):
+    planner_class = ExamplePlanner
+
     def __init__(self, row, col, file_name):
         super().__init__(row, col, file_name)
 
-    def get_agent_path(self, game_map, goal):
-        path = [game_map[self.row][self.col]]
-
-        row = self.row
-        col = self.col
-        while True:
-            if row != goal[0]:
-                row = row + 1 if row < goal[0] else row - 1
-            elif col != goal[1]:
-                col = col + 1 if col < goal[1] else col - 1
-            else:
-                break
-            path.append(game_map[row][col])
-        return path
 
 class Aki(Agent):
+    planner_class = AkiPlanner
+
     def __init__(self, row, col, file_name):
         super().__init__(row, col, file_name)
 
-    def get_agent_path(self, game_map, goal):
-        path = [game_map[self.row][self.col]]
-        directions = { 'west': [0, -1] , 'south' : [1, 0], 'east' : [0, 1], 'north': [-1, 0]}
-        bounds = [len(game_map), len(game_map[0])]
-        row = self.row
-        col = self.col
-        position = [row, col]
-        check_point = 0
-        while True:
-            next_move_cost = 1500
-            next_move = None
-            for direction in directions.values():
-                move = [pos+mov for pos,mov in zip(position, direction)]
-                if(Agent.check_bounds(move, bounds) ):
-                    tile = game_map[move[0]][move[1]]
-                    if(tile not in path and tile.cost() <= next_move_cost):
-                        next_move = tile
-                        next_move_cost = tile.cost()
-                    
-            if(next_move == None):
-                next_move = path[check_point]
-                check_point -= 1
-            else:
-                check_point = len(game_map)
-            row = next_move.row
-            col = next_move.col 
-            position = [row, col]
-            path.append(game_map[row][col])
-            if(row == goal[0] and col == goal[1]):
-                break
-        return path
 
 class Jocke(Agent):
+    planner_class = JockePlanner
+
     def __init__(self, row, col, file_name):
         super().__init__(row, col, file_name)
 
-    @staticmethod
-    def calculate_surrounding_cost(tile, game_map):
-        directions = { 'west': [0, -1] , 'south' : [1, 0], 'east' : [0, 1], 'north': [-1, 0]}
-        position = [tile.row, tile.col]
-        bounds = [len(game_map), len(game_map[0])]
-        cost = 0
-        count = 0
-        for direction in directions.values():
-            move = [pos+mov for pos,mov in zip(position, direction)]
-            if(Agent.check_bounds(move, bounds)):
-                tile = game_map[move[0]][move[1]]
-                cost +=tile.cost()
-                count += 1
-        if count == 0:
-            return 1500
-        return cost//count
-
-    def get_agent_path(self, game_map, goal):
-        path = [game_map[self.row][self.col]]
-        tiles_heap = [game_map[self.row][self.col]]
-        directions = { 'west': [0, -1] , 'south' : [1, 0], 'east' : [0, 1], 'north': [-1, 0]}
-        bounds = [len(game_map), len(game_map[0])]
-        row = self.row
-        col = self.col
-        position = [row, col]
-        cursor = 1
-        prev_cursor = 0
-        prev_tile = game_map[self.row][self.col]
-        while True:
-            tile_surrounding = []
-            #get neigbours
-            for direction in directions.values():
-                move = [pos + mov for pos,mov in zip(position, direction)]
-                if(Agent.check_bounds(move, bounds)):
-                    tile = game_map[move[0]][move[1]]
-                    if(tile not in path and tile not in tiles_heap):
-                        tile_surrounding.append(tile)
-                    
-            t_len = len(tile_surrounding)
-            #Sort the tile_surrounding
-            for i in range(0,t_len-1):
-                for j in range(i+1,t_len):
-                    if(Jocke.calculate_surrounding_cost(tile_surrounding[i], game_map) > Jocke.calculate_surrounding_cost(tile_surrounding[j], game_map)):
-                        tmp = tile_surrounding[i]
-                        tile_surrounding[i] = tile_surrounding[j]
-                        tile_surrounding[j] = tmp
-
-            #Adding surrounding to heap
-            for tl in tile_surrounding:
-                tiles_heap.append(tl)
-            for _ in range(4-len(tile_surrounding)):
-                tiles_heap.append(None)
-            print("heap", len(tiles_heap))
-
-            
-            #Skipping empty branches
-            while(tiles_heap[cursor] == None):
-                for _ in range(4):
-                    tiles_heap.append(None)
-                cursor += 1
-                print("heap", len(tiles_heap))
-            
-            next_tile  = tiles_heap[cursor]
-
-            #Finding antsestors
-            next_antsestors = []
-            next_antsestor = (cursor - 1) // 4
-            while(prev_cursor != next_antsestor):
-                if(prev_cursor < next_antsestor):
-                    next_antsestors.insert(0, tiles_heap[next_antsestor])
-                    next_antsestor = (next_antsestor - 1) // 4
-                else:
-                    if(path[-1] != tiles_heap[prev_cursor] and tiles_heap[prev_cursor] != None):
-                        path.append(tiles_heap[prev_cursor])
-                    prev_cursor = (prev_cursor - 1) // 4
-
-            if(path[-1] != tiles_heap[prev_cursor] and tiles_heap[prev_cursor] != None):
-                path.append(tiles_heap[prev_cursor])
-
-            for i in next_antsestors:
-                if(path[-1] != i and i != None):
-                    path.append(i)
-
-            row = next_tile.row
-            col = next_tile.col 
-            position = [row, col]
-            path.append(game_map[row][col])
-
-            prev_tile = next_tile
-            prev_cursor = cursor
-            cursor += 1
-            
-            if(row == goal[0] and col == goal[1]):
-                break
-        return path
 
 class Draza(Agent):
+    planner_class = DrazaPlanner
+
     def __init__(self, row, col, file_name):
         super().__init__(row, col, file_name)
 
-    @staticmethod
-    def __get_cost(path_dict):
-        return path_dict['cost']
-
-    def get_agent_path(self, game_map, goal):
-        directions = { 'west': [0, -1] , 'south' : [1, 0], 'east' : [0, 1], 'north': [-1, 0]}
-        bounds = [len(game_map), len(game_map[0])]
-        paths = [{'cost': 0, 'path' : [game_map[self.row][self.col]], 'last_pos': (self.row, self.col)}]
-
-        while True:
-            #sort path
-            paths.sort(key=Draza.__get_cost)
-            
-            #take first and return if the goal is reached
-            path = paths.pop(0)
-            if path['last_pos'] == goal:
-                return path['path']
-
-            #branch(reevaluate costs)
-
-            #find neigbours
-            for direction in directions.values():
-                move = [pos + mov for pos,mov in zip(list(path['last_pos']), direction)]
-                if(Agent.check_bounds(move, bounds)):
-                    tile = game_map[move[0]][move[1]]
-                    if(tile not in path['path']):
-                        #Add new path to paths
-                        new_path = dict(path)
-                        new_path['cost'] += tile.cost()
-                        new_path['path'] = path['path'].copy()
-                        new_path['path'].append(tile)
-                        new_path['last_pos'] = (tile.row, tile.col)
-                        paths.append(new_path)
 
 class Bole(Agent):
+    planner_class = BolePlanner
+
     def __init__(self, row, col, file_name):
         super().__init__(row, col, file_name)
-    #Heuristika: da li se prelaskom u cvor priblizavamo ili udaljavamo cilju
-    @staticmethod
-    def __heuristics(new_position, old_position, goal):
-        return (sum([abs(x-y) for x, y in zip(new_position, list(goal))]) - sum([abs(x-y) for x, y in zip(old_position, list(goal))])) * 100
-
-        
-    @staticmethod
-    def __get_cost(path_dict):
-        return path_dict['cost'] + path_dict['heuristic']
-
-    def get_agent_path(self, game_map, goal):
-        directions = { 'west': [0, -1] , 'south' : [1, 0], 'east' : [0, 1], 'north': [-1, 0]}
-        bounds = [len(game_map), len(game_map[0])]
-        paths = [{'cost': 0, 'path' : [game_map[self.row][self.col]], 'last_pos': (self.row, self.col), 'heuristic' : 0}]
-
-        row = self.row
-        col = self.col
-        while True:
-            #sort path
-            paths.sort(key=Bole.__get_cost)
-            
-            #take first and return if the goal is reached
-            path = paths.pop(0)
-            if path['last_pos'] == goal:
-                return path['path']
-
-            #branch(reevaluate costs)
-
-            #find neigbours
-            for direction in directions.values():
-                move = [pos + mov for pos,mov in zip(list(path['last_pos']), direction)]
-                if(Agent.check_bounds(move, bounds)):
-                    tile = game_map[move[0]][move[1]]
-                    if(tile not in path['path']):
-                        #Add new path to paths
-                        new_path = dict(path)
-                        new_path['cost'] += tile.cost()
-                        new_path['path'] = path['path'].copy()
-                        new_path['path'].append(tile)
-                        new_path['heuristic'] = Bole.__heuristics(move, list(path['last_pos']), goal)
-                        new_path['last_pos'] = (tile.row, tile.col)
-                        paths.append(new_path)
 
 class Tile(BaseSprite):
     def __init__(self, row, col, file_name):
@@ -379,12 +210,22 @@ class Goal(BaseSprite):
         super().__init__(row, col, 'x.png', config.DARK_GREEN)
 
 
+# Rendered trail numbers - a font is only asked to render a number once, the trails that are
+# made again for the whole path at the end of the game get the same surfaces back.
+@lru_cache(maxsize=config.GLYPH_CACHE_SIZE)
+def number_glyph(num, font):
+    return font.render(f'{num}', True, config.WHITE)
+
+
 class Trail(BaseSprite):
     def __init__(self, row, col, num):
         super().__init__(row, col, 'trail.png', config.DARK_GREEN)
         self.num = num
+        self.text = None
+        self.text_rect = None
 
     def draw(self, screen):
-        text = config.GAME_FONT.render(f'{self.num}', True, config.WHITE)
-        text_rect = text.get_rect(center=self.rect.center)
-        screen.blit(text, text_rect)
+        if self.text is None:
+            self.text = number_glyph(self.num, config.GAME_FONT)
+            self.text_rect = self.text.get_rect(center=self.rect.center)
+        screen.blit(self.text, self.text_rect)
@@ -25,7 +25,7 @@ class Agent(BaseSprite):
 
     def copy(self):
         agent_copy = copy.copy(self)
-        agent_copy.rect = self.image.get_rect()
+        agent_copy.rect = self.rect.copy()
         agent_copy.place_to(self.position())
         return agent_copy
 
@@ -0,0 +1,104 @@
+from actions import Action
+
+# Bitboard of a PyStolovina board, without pygame. Cell (row, col) is bit row * cols + col.
+# roads has the bits of the cells an agent can step on set; the cells the agents stand on and the
+# holes are not roads. A move clears the bit of the cell the agent steps on (the cell it leaves was
+# not a road to begin with and becomes a hole), so making or unmaking a move is one bit operation.
+
+# (rows, cols) -> (neighbour masks, neighbours), see board_tables
+_board_tables = {}
+
+
+# return value - (list of the masks of the up to 8 neighbours of every cell,
+#                 list of dicts action name -> neighbour cell of every cell, in the order of Action.actions)
+def board_tables(rows, cols):
+    tables = _board_tables.get((rows, cols))
+    if tables is None:
+        masks = []
+        neighbours = []
+        for row in range(rows):
+            for col in range(cols):
+                targets = {}
+                for name, (d_row, d_col) in Action.actions.items():
+                    if 0 <= row + d_row < rows and 0 <= col + d_col < cols:
+                        targets[name] = (row + d_row) * cols + col + d_col
+                masks.append(sum(1 << target for target in targets.values()))
+                neighbours.append(targets)
+        tables = _board_tables[(rows, cols)] = masks, neighbours
+    return tables
+
+
+# number of set bits, int.bit_count is there from Python 3.10
+bit_count = getattr(int, 'bit_count', None) or (lambda mask: bin(mask).count('1'))
+
+
+class Bitboard:
+    # roads - mask of the road cells, positions - cell of every agent (agent id is the list index)
+    def __init__(self, rows, cols, roads, positions, active=None, last_agent_played_id=None):
+        self.rows = rows
+        self.cols = cols
+        self.roads = roads
+        self.positions = list(positions)
+        self.active = list(active) if active is not None else [True] * len(self.positions)
+        self.last_agent_played_id = last_agent_played_id
+        self.masks, self.neighbours = board_tables(rows, cols)
+
+    def copy(self):
+        return Bitboard(self.rows, self.cols, self.roads, self.positions, self.active, self.last_agent_played_id)
+
+    def position(self, agent_id):
+        return divmod(self.positions[agent_id], self.cols)
+
+    # return value - mask of the cells the agent can move to
+    def legal_moves(self, agent_id):
+        if not self.active[agent_id]:
+            return 0
+        return self.masks[self.positions[agent_id]] & self.roads
+
+    def move_count(self, agent_id):
+        return bit_count(self.legal_moves(agent_id))
+
+    # return value - names of the legal actions, in the order of GameState.get_legal_actions
+    def get_legal_actions(self, agent_id):
+        moves = self.legal_moves(agent_id)
+        if not moves:
+            return []
+        return [name for name, cell in self.neighbours[self.positions[agent_id]].items() if moves >> cell & 1]
+
+    # Applies the action in place.
+    # return value - undo record for unmake_action
+    def make_action(self, agent_id, action):
+        if action not in Action.actions:
+            raise Exception(f'ERR: {action} is not a legal action names! '
+                            f'Legal names are ({", ".join(n for n in Action.actions.keys())})')
+        cell = self.positions[agent_id]
+        new_cell = self.neighbours[cell].get(action)
+        if new_cell is None or not self.legal_moves(agent_id) >> new_cell & 1:
+            raise Exception(f'ERR: {action} is not legal! '
+                            f'Agent position: {self.position(agent_id)}')
+        self.roads ^= 1 << new_cell
+        self.positions[agent_id] = new_cell
+        undo = agent_id, cell, self.last_agent_played_id
+        self.last_agent_played_id = agent_id
+        return undo
+
+    def unmake_action(self, undo):
+        agent_id, cell, self.last_agent_played_id = undo
+        self.roads |= 1 << self.positions[agent_id]
+        self.positions[agent_id] = cell
+
+    # return value - (win, loss) of the agent, like GameState.is_agent_win and is_agent_loss
+    def agent_win_loss(self, agent_id):
+        others = any(self.legal_moves(other) for other in range(len(self.positions)) if other != agent_id)
+        own = bool(self.legal_moves(agent_id))
+        if own and not others:
+            return True, False
+        if others and not own:
+            return False, True
+        if not own and not others and self.last_agent_played_id is not None:
+            return self.last_agent_played_id == agent_id, self.last_agent_played_id != agent_id
+        return False, False
+
+    # return value - (win, loss) of the student agent (id 0), like GameState.adjust_win_loss
+    def win_loss(self):
+        return self.agent_win_loss(0)
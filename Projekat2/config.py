@@ -9,6 +9,14 @@ TILE_SIZE = None
 GAME_SPEED = None
 GAME_FONT = None
 RIBBON_HEIGHT = None
+# slots of the transposition table every search agent keeps between its turns
+TRANSPOSITION_TABLE_SIZE = 1 << 16
+# seconds an agent has for a move (argv[3] of the game), the deepening agents stop their search after
+# THINK_TIME_SHARE of it to answer in time
+MAX_THINK_TIME = 1
+THINK_TIME_SHARE = 0.8
+# order the actions of the alpha-beta searches by killer actions, history and mobility (see ordering.py)
+MOVE_ORDERING = True
 
 # define colors
 WHITE = (255, 255, 255)
@@ -10,6 +10,7 @@ from queue import Queue
 from actions import Action
 from states import GameState
 from bots import BotAgent, Aki
+from mapfile import load_map
 from students import StudentAgent
 from tiles import Hole, Road, X
 from util import TimedFunction, Timeout
@@ -73,6 +74,7 @@ class Game:
         if len(self.agents) and self.agents[0].get_id():
             raise Exception(f'ERR: StudentAgent NOT defined!')
         self.max_think_time = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+        config.MAX_THINK_TIME = self.max_think_time
         self.max_levels = int(sys.argv[4]) if len(sys.argv) > 4 else -1
         GameState.initial_state = GameState(self.char_map, self.agents, None)
         self.state = GameState.initial_state.copy()
@@ -81,23 +83,15 @@ class Game:
         self.playing = False
         self.game_over = False
 
+    # return value - MapView of the memory-mapped file, or a list of lists if the file has rows of
+    # different lengths, see mapfile.load_map
     @staticmethod
     def load_map(map_name):
-        try:
-            with open(map_name, 'r') as f:
-                matrix = []
-                while True:
-                    line = f.readline().strip()
-                    if not len(line):
-                        break
-                    matrix.append([c for c in line])
-            return matrix
-        except Exception as e:
-            raise e
+        return load_map(map_name)
 
     def activate_agent(self, agent_id):
         self.agents[agent_id].set_active(True)
-        self.state.agents[agent_id].set_active(True)
+        self.state.set_agent_active(agent_id, True)
         for x in self.x_sprites:
             if x.rect == self.agents[agent_id].rect:
                 self.x_sprites.remove(x)
@@ -106,7 +100,7 @@ class Game:
 
     def deactivate_agent(self, agent_id):
         self.agents[agent_id].set_active(False)
-        self.state.agents[agent_id].set_active(False)
+        self.state.set_agent_active(agent_id, False)
         self.x_sprites.add(X(self.agents[agent_id].position()))
         self.draw()
 
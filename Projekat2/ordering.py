@@ -0,0 +1,79 @@
+from actions import Action
+from tiles import Road
+
+# Move ordering of the alpha-beta searches - the sooner the best action is tried, the more of the
+# others are cut off. The actions of a node are tried in this order:
+#   the best action the transposition table has for the state (see DeepeningAgent.ordered_actions),
+#   the killer actions of the ply (the last actions that caused a cutoff at the same ply),
+#   then by the history score (sum of depth * depth of the cutoffs the action caused from the same
+#   position), and by the mobility (roads around the field the action moves to),
+#   ties keep the order of Action.actions.
+# The counters show how well it works: a good order cuts off at the first action most of the time.
+
+KILLERS_PER_PLY = 2
+
+
+# return value - number of road fields around the position
+def exits(char_map, position):
+    rows, cols = len(char_map), len(char_map[0])
+    road = Road.kind()
+    count = 0
+    for d_row, d_col in Action.actions.values():
+        row, col = position[0] + d_row, position[1] + d_col
+        if 0 <= row < rows and 0 <= col < cols and char_map[row][col] == road:
+            count += 1
+    return count
+
+
+class MoveOrdering:
+    def __init__(self):
+        # ply -> killer actions, the latest first
+        self.killers = {}
+        # (agent id, position, action) -> history score
+        self.history = {}
+        # interior nodes searched, cutoffs, cutoffs at the first action tried
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+
+    # called at the start of every turn, the history of the earlier turns counts half as much
+    def new_search(self):
+        self.killers = {}
+        self.history = {key: score // 2 for key, score in self.history.items() if score > 1}
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_cutoffs = 0
+
+    # ply - number of actions from the root of the search
+    # hash_action - best action from the transposition table or None
+    def order(self, state, agent_id, actions, ply, hash_action=None):
+        position = state.agents[agent_id].position()
+        killers = self.killers.get(ply, ())
+        history = self.history
+
+        def score(action):
+            d_row, d_col = Action.actions[action]
+            return (action == hash_action,
+                    KILLERS_PER_PLY - killers.index(action) if action in killers else 0,
+                    history.get((agent_id, position, action), 0),
+                    exits(state.char_map, (position[0] + d_row, position[1] + d_col)))
+        return sorted(actions, key=score, reverse=True)
+
+    # The action of the agent (at position) caused a cutoff.
+    # depth - depth left below the node, move_number - how many actions of the node were tried before
+    def cutoff(self, agent_id, position, action, ply, depth, move_number):
+        self.cutoffs += 1
+        if not move_number:
+            self.first_cutoffs += 1
+        killers = self.killers.setdefault(ply, [])
+        if action in killers:
+            killers.remove(action)
+        killers.insert(0, action)
+        del killers[KILLERS_PER_PLY:]
+        key = agent_id, position, action
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+    def __str__(self):
+        rate = self.cutoffs / self.nodes * 100 if self.nodes else 0
+        first = self.first_cutoffs / self.cutoffs * 100 if self.cutoffs else 0
+        return f'nodes {self.nodes}, cutoffs {self.cutoffs} ({rate:.1f}%), at the first action {first:.1f}%'
@@ -1,18 +1,22 @@
-import copy
-
 from actions import Action
-from tiles import Hole
+from bitboard import Bitboard
+from tiles import Hole, Road
+from transposition import state_hash, zobrist_key
 
 
 class GameState:
     initial_state = None
 
-    def __init__(self, char_map, agents, last_agent_played_id):
+    # zobrist_hash - Zobrist hash of the state when it is already known (e.g. of the copied state)
+    def __init__(self, char_map, agents, last_agent_played_id, zobrist_hash=None):
         self.char_map = char_map
         self.agents = agents
         self.last_agent_played_id = last_agent_played_id
         self.win = False
         self.loss = False
+        # Zobrist hash, computed when the state is made from a map and kept up to date by make_action,
+        # unmake_action and set_agent_active
+        self.hash = zobrist_hash if zobrist_hash is not None else state_hash(char_map, agents, last_agent_played_id)
 
     def __str__(self):
         return '\n'.join([''.join(row) for row in self.char_map])
@@ -28,10 +32,38 @@ class GameState:
             self.win = True if self.last_agent_played_id is not None and self.last_agent_played_id == 0 else False
 
     def copy(self):
-        char_map_copy = copy.deepcopy(self.char_map)
+        char_map_copy = [list(row) for row in self.char_map]
         agents_copy = [a.copy() for a in self.agents]
         last_agent_played_id = self.last_agent_played_id
-        return GameState(char_map_copy, agents_copy, last_agent_played_id)
+        return GameState(char_map_copy, agents_copy, last_agent_played_id, self.hash)
+
+    def set_agent_active(self, agent_id, active):
+        agent = self.agents[agent_id]
+        if agent.is_active() != active:
+            agent.set_active(active)
+            self.hash ^= zobrist_key('inactive', agent_id)
+
+    def to_bitboard(self):
+        cols = len(self.char_map[0])
+        road = Road.kind()
+        cells = ''.join('1' if el == road else '0' for row in self.char_map for el in row)
+        positions = [agent.row * cols + agent.col for agent in self.agents]
+        return Bitboard(len(self.char_map), cols, int(cells[::-1], 2), positions,
+                        [agent.is_active() for agent in self.agents], self.last_agent_played_id)
+
+    # agents - agents of the state the bitboard was made from, their copies are placed as on the board
+    @staticmethod
+    def from_bitboard(board, agents):
+        road, hole = Road.kind(), Hole.kind()
+        char_map = [[road if board.roads >> (row * board.cols + col) & 1 else hole for col in range(board.cols)]
+                    for row in range(board.rows)]
+        agents_copy = [a.copy() for a in agents]
+        for agent_id, agent in enumerate(agents_copy):
+            row, col = board.position(agent_id)
+            agent.place_to((row, col))
+            agent.set_active(board.active[agent_id])
+            char_map[row][col] = agent.kind()
+        return GameState(char_map, agents_copy, board.last_agent_played_id)
 
     def is_win(self):
         return self.win
@@ -78,19 +110,42 @@ class GameState:
                 actions.append(act_name)
         return actions
 
+    # Copy of the state with the action applied, the state itself is not changed.
     def apply_action(self, agent_id, action):
         state = self.copy()
+        state.make_action(agent_id, action)
+        return state
+
+    # Applies the action to this state in place, for searches that walk the tree on one state.
+    # return value - undo record, unmake_action(undo) puts the state back as it was before the action
+    def make_action(self, agent_id, action):
         if action not in Action.actions.keys():
             raise Exception(f'ERR: {action} is not a legal action names! '
                             f'Legal names are ({", ".join(n for n in Action.actions.keys())})')
-        agent = state.agents[agent_id]
+        agent = self.agents[agent_id]
         old_agent_pos = agent.position()
         new_agent_pos = tuple(map(sum, zip(old_agent_pos, Action.actions[action])))
         if not self.is_position_legal(new_agent_pos, agent):
             raise Exception(f'ERR: {action} is not legal! '
                             f'Agent position: {old_agent_pos}')
-        state.char_map[old_agent_pos[0]][old_agent_pos[1]] = Hole.kind()
-        state.char_map[new_agent_pos[0]][new_agent_pos[1]] = agent.kind()
+        new_field = self.char_map[new_agent_pos[0]][new_agent_pos[1]]
+        undo = (agent_id, old_agent_pos, new_field, agent.last_action,
+                self.last_agent_played_id, self.win, self.loss, self.hash)
+        self.char_map[old_agent_pos[0]][old_agent_pos[1]] = Hole.kind()
+        self.char_map[new_agent_pos[0]][new_agent_pos[1]] = agent.kind()
+        self.hash ^= (zobrist_key(*old_agent_pos, agent.kind()) ^ zobrist_key(*old_agent_pos, Hole.kind()) ^
+                      zobrist_key(*new_agent_pos, new_field) ^ zobrist_key(*new_agent_pos, agent.kind()) ^
+                      zobrist_key('last', self.last_agent_played_id) ^ zobrist_key('last', agent_id))
         agent.apply_action(action)
-        state.last_agent_played_id = agent_id
-        return state
+        self.last_agent_played_id = agent_id
+        return undo
+
+    # undo - record returned by make_action, the actions are undone in the reverse order of making them
+    def unmake_action(self, undo):
+        agent_id, old_agent_pos, new_field, last_action, self.last_agent_played_id, self.win, self.loss, self.hash = undo
+        agent = self.agents[agent_id]
+        new_agent_pos = agent.position()
+        self.char_map[new_agent_pos[0]][new_agent_pos[1]] = new_field
+        self.char_map[old_agent_pos[0]][old_agent_pos[1]] = agent.kind()
+        agent.place_to(old_agent_pos)
+        agent.last_action = last_action
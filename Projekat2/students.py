@@ -1,6 +1,11 @@
 import random
+import time
 
+import config
 from agents import Agent
+from ordering import MoveOrdering
+from tiles import Road
+from transposition import EXACT, TranspositionTable
 
 
 # Example agent, behaves randomly.
@@ -27,11 +32,108 @@ class StudentAgent(Agent):
         return chosen_action
 
 
+# key of a state in the transposition table - (hash, agent to move, depth left or -1 for unlimited depth)
+def table_key(state, agent_id, max_levels, current_level):
+    return state.hash, agent_id, -1 if max_levels == -1 else max_levels - current_level
 
-class MinimaxAgent(StudentAgent):
+
+# Agents with a transposition table, kept between the turns. The root of the search (at root_level) is
+# never taken from it.
+class TableAgent(StudentAgent):
     def __init__(self, position, file_name):
         super().__init__(position, file_name)
         self.max_levels = -1
+        self.table = TranspositionTable(config.TRANSPOSITION_TABLE_SIZE)
+        self.root_level = None
+
+
+class OutOfTime(Exception):
+    pass
+
+
+# Agents that search deeper and deeper until their time runs out (config.MAX_THINK_TIME, the game sets it
+# from its command line) and play the best action of the last depth they searched completely.
+# The search of the agent calls check_time at every node, takes its actions from ordered_actions and
+# reports its cutoffs to record_cutoff (see ordering.py).
+class DeepeningAgent(TableAgent):
+    # values of a won and a lost state, searching deeper does not change them
+    proven_values = (-10, 10)
+
+    def __init__(self, position, file_name):
+        super().__init__(position, file_name)
+        self.deadline = None
+        self.searched_depth = 0
+        self.ordering = MoveOrdering()
+        # set when the search stopped at the depth limit somewhere, or took a value from the table
+        # that was searched to a limited depth
+        self.depth_cut = False
+
+    def check_time(self):
+        if time.perf_counter() > self.deadline:
+            raise OutOfTime()
+
+    # return value - the value of the state from the table if it settles the node, otherwise None
+    def table_value(self, key, alpha, beta):
+        value = self.table.probe(key, alpha, beta)
+        if value is not None and key[2] >= 0 and value not in self.proven_values:
+            self.depth_cut = True
+        return value
+
+    # The best action the previous depth found for the state comes first, with config.MOVE_ORDERING
+    # the others are ordered by MoveOrdering.
+    # key - table key of the state, see table_key
+    def ordered_actions(self, state, agent_id, key, current_level):
+        self.ordering.nodes += 1
+        actions = state.get_legal_actions(agent_id)
+        state_hash, _, depth = key
+        hash_action = None
+        if depth > 0:
+            entry = self.table.get((state_hash, agent_id, depth - 1))
+            if entry is not None and entry[2] in actions:
+                hash_action = entry[2]
+        if config.MOVE_ORDERING:
+            return self.ordering.order(state, agent_id, actions, current_level - self.root_level, hash_action)
+        if hash_action is not None:
+            actions.remove(hash_action)
+            actions.insert(0, hash_action)
+        return actions
+
+    # move_number - how many actions of the node were tried before the one that caused the cutoff
+    def record_cutoff(self, state, agent_id, action, current_level, move_number):
+        self.ordering.cutoff(agent_id, state.agents[agent_id].position(), action, current_level - self.root_level,
+                             self.max_levels - current_level, move_number)
+
+    # search(state) - searches the state down to self.max_levels, return value - (value, actions)
+    # max_levels - the deepest depth to search, -1 for as deep as the game can go (a move takes a road)
+    # return value - (value, actions) of the last depth searched completely, None if not even depth 1 was
+    def deepen(self, state, max_levels, search):
+        self.deadline = time.perf_counter() + config.MAX_THINK_TIME * config.THINK_TIME_SHARE
+        self.table.new_search()
+        self.ordering.new_search()
+        self.root_level = 0
+        # the search makes and unmakes the actions on its own copy, running out of time leaves it half done
+        state = state.copy()
+        if max_levels == -1:
+            max_levels = sum(row.count(Road.kind()) for row in state.char_map) + 1
+        result = None
+        for depth in range(1, max_levels + 1):
+            self.max_levels = depth
+            self.depth_cut = False
+            try:
+                result = search(state)
+            except OutOfTime:
+                break
+            self.searched_depth = depth
+            if not self.depth_cut or result[0] in self.proven_values:
+                # nothing was left below the depth limit or the game is decided,
+                # a deeper search gives the same result
+                break
+        return result
+
+
+class MinimaxAgent(TableAgent):
+    def __init__(self, position, file_name):
+        super().__init__(position, file_name)
     
     def __minmax(self, state, current_level, agent_id):
         state.adjust_win_loss()
@@ -50,13 +152,21 @@ class MinimaxAgent(StudentAgent):
         if not self.max_levels == -1 and current_level == self.max_levels:
             return len(state.get_legal_actions(self.id)) - len(state.get_legal_actions(abs(self.id-1))), []
 
+        key = table_key(state, agent_id, self.max_levels, current_level)
+        if current_level != self.root_level:
+            value = self.table.probe(key)
+            if value is not None:
+                return value, []
+
         is_max = agent_id == self.id
         best_action_val = -11 if is_max else 11
         actions_list = []
+        best_action = None
 
         for action in state.get_legal_actions(agent_id):
-            new_state = state.apply_action(agent_id, action)
-            action_val, _ = self.__minmax(new_state, current_level + 1, (agent_id + 1) % 2)
+            undo = state.make_action(agent_id, action)
+            action_val, _ = self.__minmax(state, current_level + 1, (agent_id + 1) % 2)
+            state.unmake_action(undo)
 
             if best_action_val == action_val:
                 actions_list.append(action)
@@ -65,11 +175,14 @@ class MinimaxAgent(StudentAgent):
                 best_action_val = action_val
                 actions_list = []
                 actions_list.append(action)
+                best_action = action
             
             if (not is_max) and best_action_val > action_val:
                 best_action_val = action_val
                 actions_list = []
+                best_action = action
 
+        self.table.put(key, best_action_val, EXACT, best_action)
         return best_action_val, actions_list
 
     def get_next_action(self, state, max_levels):
@@ -77,19 +190,22 @@ class MinimaxAgent(StudentAgent):
             raise Exception("Student mora imati jednog protivnika")
         self.max_levels = max_levels
 
-        val, actions = self.__minmax(state, self.id, 0)
+        self.table.new_search()
+        self.root_level = self.id
+        # the search makes and unmakes the actions on its own copy, a timeout can stop it at any point
+        val, actions = self.__minmax(state.copy(), self.id, 0)
         return actions[0]
 
 
 
 
 
-class MinimaxABAgent(StudentAgent):
+class MinimaxABAgent(DeepeningAgent):
     def __init__(self, position, file_name):
         super().__init__(position, file_name)
-        self.max_levels = -1
 
     def __minmaxAB(self, state, current_level, agent_id, alpha, beta):
+        self.check_time()
         state.adjust_win_loss()
         if state.is_win():
             if self.id == 0:
@@ -104,15 +220,25 @@ class MinimaxABAgent(StudentAgent):
                 return 10, []
         
         if not self.max_levels == -1 and current_level == self.max_levels:
+            self.depth_cut = True
             return len(state.get_legal_actions(self.id)) - len(state.get_legal_actions(abs(self.id-1))), []
 
+        key = table_key(state, agent_id, self.max_levels, current_level)
+        if current_level != self.root_level:
+            value = self.table_value(key, alpha, beta)
+            if value is not None:
+                return value, []
+        alpha_start, beta_start = alpha, beta
+
         is_max = agent_id == self.id
         best_action_val = -11 if is_max else 11
         actions_list = []
+        best_action = None
 
-        for action in state.get_legal_actions(agent_id):
-            new_state = state.apply_action(agent_id, action)
-            action_val, _ = self.__minmaxAB(new_state, current_level + 1, (agent_id + 1) % 2, alpha, beta)
+        for move_number, action in enumerate(self.ordered_actions(state, agent_id, key, current_level)):
+            undo = state.make_action(agent_id, action)
+            action_val, _ = self.__minmaxAB(state, current_level + 1, (agent_id + 1) % 2, alpha, beta)
+            state.unmake_action(undo)
 
             if best_action_val == action_val:
                 actions_list.append(action)
@@ -121,33 +247,40 @@ class MinimaxABAgent(StudentAgent):
                 best_action_val = action_val
                 actions_list = []
                 actions_list.append(action)
+                best_action = action
                 alpha = max(alpha, best_action_val)
                 if beta <= alpha:
+                    self.record_cutoff(state, agent_id, action, current_level, move_number)
                     break
             
             if (not is_max) and best_action_val > action_val:
                 best_action_val = action_val
                 actions_list = []
+                best_action = action
                 beta = min(beta, best_action_val)
                 if beta <= alpha:
+                    self.record_cutoff(state, agent_id, action, current_level, move_number)
                     break
 
+        self.table.put(key, best_action_val, TranspositionTable.bound(best_action_val, alpha_start, beta_start),
+                       best_action)
         return best_action_val, actions_list
 
     def get_next_action(self, state, max_levels):
         if len(state.agents) != 2:
             raise Exception("Student mora imati jednog protivnika")
-        self.max_levels = max_levels
-
-        val, actions = self.__minmaxAB(state, 0, self.id, -11, 11)
-        print(f"Agent {self.id}: potezi {actions}, sa vrednoscu {val}")
+        result = self.deepen(state, max_levels, lambda root: self.__minmaxAB(root, 0, self.id, -11, 11))
+        if result is None:
+            actions = state.get_legal_actions(self.id)
+            return actions[0] if actions else None
+        val, actions = result
+        print(f"Agent {self.id}: potezi {actions}, sa vrednoscu {val} (dubina {self.searched_depth}, {self.ordering})")
         return actions[0]
 
 
-class ExpectAgent(StudentAgent):
+class ExpectAgent(TableAgent):
     def __init__(self, position, file_name):
         super().__init__(position, file_name)
-        self.max_levels = -1
     
     def __expectimax(self, state, current_level, agent_id):
         state.adjust_win_loss()
@@ -166,6 +299,12 @@ class ExpectAgent(StudentAgent):
         if not self.max_levels == -1 and current_level == self.max_levels:
             return len(state.get_legal_actions(self.id)) - len(state.get_legal_actions(abs(self.id - 1))), []
 
+        key = table_key(state, agent_id, self.max_levels, current_level)
+        if current_level != self.root_level:
+            value = self.table.probe(key)
+            if value is not None:
+                return value, []
+
         is_max = agent_id == self.id
         if is_max:
             best_action_val = -2 if is_max else 2
@@ -176,8 +315,9 @@ class ExpectAgent(StudentAgent):
         actions = state.get_legal_actions(agent_id)
         probability = 1/len(actions)
         for action in actions:
-            new_state = state.apply_action(agent_id, action)
-            action_val, _ = self.__expectimax(new_state, current_level + 1, (agent_id + 1) % 2)
+            undo = state.make_action(agent_id, action)
+            action_val, _ = self.__expectimax(state, current_level + 1, (agent_id + 1) % 2)
+            state.unmake_action(undo)
 
             if best_action_val == action_val:
                 actions_list.append(action)
@@ -190,6 +330,7 @@ class ExpectAgent(StudentAgent):
             if (not is_max):
                 best_action_val += probability * action_val
 
+        self.table.put(key, best_action_val, EXACT, actions_list[0] if actions_list else None)
         return best_action_val, actions_list
 
     def get_next_action(self, state, max_levels):
@@ -197,15 +338,19 @@ class ExpectAgent(StudentAgent):
             raise Exception("Student mora imati jednog protivnika")
         self.max_levels = max_levels
 
-        val, actions = self.__expectimax(state, self.id, 0)
+        self.table.new_search()
+        self.root_level = self.id
+        val, actions = self.__expectimax(state.copy(), self.id, 0)
         return actions[0]
 
-class MaxNAgent(StudentAgent):
+class MaxNAgent(DeepeningAgent):
+    proven_values = (-1, 10)
+
     def __init__(self, position, file_name):
         super().__init__(position, file_name)
-        self.max_levels = -1
 
     def __minmaxNAB(self, state, current_level, agent_id, alpha, beta):
+        self.check_time()
         is_max = agent_id == self.id
         #Terminal node
         if state.is_agent_win(self.id):
@@ -213,21 +358,30 @@ class MaxNAgent(StudentAgent):
         if state.is_agent_loss(self.id):
             return -1, []
         if not self.max_levels == -1 and current_level == self.max_levels:
+            self.depth_cut = True
             #More legal moves the better
             return len(state.get_legal_actions(self.id)), []
 
+        key = table_key(state, agent_id, self.max_levels, current_level)
+        if current_level != self.root_level:
+            value = self.table_value(key, alpha, beta)
+            if value is not None:
+                return value, []
+        alpha_start, beta_start = alpha, beta
+
         best_action_val = -2 if is_max else 11
         actions_list = []
-        actions = state.get_legal_actions(agent_id)
+        best_action = None
+        actions = self.ordered_actions(state, agent_id, key, current_level)
 
         if len(actions) == 0:
             best_action_val, _ = self.__minmaxNAB(state, current_level, (agent_id + 1) % len(state.agents), alpha, beta)
         else:
-            for action in actions:
-                new_state = state.apply_action(agent_id, action)
+            for move_number, action in enumerate(actions):
+                undo = state.make_action(agent_id, action)
+                action_val, tmp = self.__minmaxNAB(state, current_level + 1, (agent_id + 1) % len(state.agents), alpha, beta)
+                state.unmake_action(undo)
 
-                action_val, tmp = self.__minmaxNAB(new_state, current_level + 1, (agent_id + 1) % len(state.agents), alpha, beta)
-                
                 if best_action_val == action_val:
                     actions_list.append(action)
 
@@ -235,20 +389,29 @@ class MaxNAgent(StudentAgent):
                     best_action_val = action_val
                     actions_list = []
                     actions_list.append(action)
+                    best_action = action
                     alpha = max(alpha, best_action_val)
                     if beta <= alpha:
+                        self.record_cutoff(state, agent_id, action, current_level, move_number)
                         break
                 
                 if (not is_max) and best_action_val > action_val:
                     best_action_val = action_val
                     actions_list = []
+                    best_action = action
                     beta = min(beta, best_action_val)
                     if beta <= alpha:
+                        self.record_cutoff(state, agent_id, action, current_level, move_number)
                         break
 
+        self.table.put(key, best_action_val, TranspositionTable.bound(best_action_val, alpha_start, beta_start),
+                       best_action)
         return best_action_val, actions_list
 
     def get_next_action(self, state, max_levels):
-        self.max_levels = max_levels
-        val, actions = self.__minmaxNAB(state, 0, self.id, -3, 11)
+        result = self.deepen(state, max_levels, lambda root: self.__minmaxNAB(root, 0, self.id, -3, 11))
+        if result is None:
+            actions = state.get_legal_actions(self.id)
+            return actions[0] if actions else None
+        val, actions = result
         return actions[0]
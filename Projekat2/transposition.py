@@ -0,0 +1,85 @@
+import random
+
+# Zobrist hashing - every feature of a state (a field at a position, an inactive agent, the last agent
+# played) gets a random 64 bit key and the hash of a state is the XOR of the keys of its features,
+# so a move updates it with a few XORs instead of hashing the whole map again.
+# The keys are drawn from a fixed seed the first time a feature is used.
+
+_rng = random.Random(2021)
+_keys = {}
+
+# bound types of the stored values
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+def zobrist_key(*feature):
+    key = _keys.get(feature)
+    if key is None:
+        key = _keys[feature] = _rng.getrandbits(64)
+    return key
+
+
+def state_hash(char_map, agents, last_agent_played_id):
+    value = zobrist_key('last', last_agent_played_id)
+    for row, fields in enumerate(char_map):
+        for col, field in enumerate(fields):
+            value ^= zobrist_key(row, col, field)
+    for agent_id, agent in enumerate(agents):
+        if not agent.is_active():
+            value ^= zobrist_key('inactive', agent_id)
+    return value
+
+
+# Fixed number of slots, an entry goes to the slot hash(key) % size. The table is kept by an agent
+# between its turns: an entry from an earlier turn is always replaced, an entry of the current turn
+# only by one searched at least as deep.
+class TranspositionTable:
+    def __init__(self, size):
+        self.size = size
+        self.slots = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    # called at the start of every turn
+    def new_search(self):
+        self.generation += 1
+
+    # key - (state hash, agent to move, depth left or -1 for unlimited depth)
+    # return value - (value, bound, best action) or None
+    def get(self, key):
+        self.probes += 1
+        slot = self.slots[hash(key) % self.size]
+        if slot is not None and slot[0] == key:
+            self.hits += 1
+            return slot[1:4]
+        return None
+
+    # return value - the stored value if it settles the node searched with the (alpha, beta) window,
+    # otherwise None; searches without a window only take exact values
+    def probe(self, key, alpha=None, beta=None):
+        entry = self.get(key)
+        if entry is None:
+            return None
+        value, bound, _ = entry
+        if bound == EXACT or alpha is not None and (bound == LOWER and value >= beta or
+                                                    bound == UPPER and value <= alpha):
+            return value
+        return None
+
+    def put(self, key, value, bound, action):
+        index = hash(key) % self.size
+        slot = self.slots[index]
+        if slot is None or slot[4] != self.generation or key[2] < 0 or key[2] >= slot[0][2]:
+            self.slots[index] = (key, value, bound, action, self.generation)
+
+    # bound type of a value found with the (alpha, beta) window the node was entered with
+    @staticmethod
+    def bound(value, alpha, beta):
+        if value <= alpha:
+            return UPPER
+        if value >= beta:
+            return LOWER
+        return EXACT